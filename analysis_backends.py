@@ -0,0 +1,255 @@
+"""
+Analysis Backends Module
+Interchangeable model backends for SOPAnalyzer: the live Gemini API, a
+recorder that saves every response to disk, and a replayer that serves
+those recordings offline
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+
+BACKENDS = ("gemini", "record", "replay")
+DEFAULT_RECORDINGS_DIR = "recordings"
+
+
+class BackendResponse:
+    """Minimal response object exposing `.text`, like the Gemini SDK's"""
+    
+    def __init__(self, text: str):
+        self.text = text
+
+
+class AnalysisBackend(ABC):
+    """
+    Interface every backend implements
+    
+    Mirrors the Gemini SDK's GenerativeModel, so SOPAnalyzer can call any
+    backend the same way.
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    def generate_content(self, content_parts: List, generation_config: Dict = None, stream: bool = False):
+        """
+        Run one request
+        
+        Returns:
+            A response with `.text`, or an iterator of such chunks if `stream`
+        """
+    
+    async def generate_content_async(self, content_parts: List, generation_config: Dict = None):
+        """Asyncio version of generate_content() (runs it in a thread by default)"""
+        return await asyncio.to_thread(self.generate_content, content_parts, generation_config)
+
+
+class GeminiBackend(AnalysisBackend):
+    """The live Google Gemini API"""
+    
+    name = "gemini"
+    
+    def __init__(self, model_name: str, api_key: Optional[str] = None):
+        """
+        Args:
+            model_name: Gemini model to call
+            api_key: Google API key (if not provided, reads from .env)
+        """
+        import google.generativeai as genai
+        
+        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        if not self.api_key:
+            raise ValueError("GOOGLE_API_KEY not found. Please set it in .env file")
+        
+        # Configure Google API
+        genai.configure(api_key=self.api_key)
+        self.model = genai.GenerativeModel(model_name)
+    
+    def generate_content(self, content_parts: List, generation_config: Dict = None, stream: bool = False):
+        return self.model.generate_content(content_parts, generation_config=generation_config, stream=stream)
+    
+    async def generate_content_async(self, content_parts: List, generation_config: Dict = None):
+        return await self.model.generate_content_async(content_parts, generation_config=generation_config)
+
+
+class RecordingBackend(AnalysisBackend):
+    """Passes requests to another backend and saves each response to disk"""
+    
+    name = "record"
+    
+    def __init__(self, backend: AnalysisBackend, recordings_dir: str = DEFAULT_RECORDINGS_DIR):
+        """
+        Args:
+            backend: Backend that answers the requests (normally Gemini)
+            recordings_dir: Directory the recordings are written to
+        """
+        self.backend = backend
+        self.recordings_dir = recordings_dir
+        os.makedirs(recordings_dir, exist_ok=True)
+    
+    def generate_content(self, content_parts: List, generation_config: Dict = None, stream: bool = False):
+        fingerprint = request_fingerprint(content_parts, generation_config)
+        start_time = time.time()
+        
+        if stream:
+            return self._record_stream(
+                self.backend.generate_content(content_parts, generation_config, stream=True),
+                fingerprint,
+                start_time
+            )
+        
+        response = self.backend.generate_content(content_parts, generation_config)
+        self._save(fingerprint, response.text, time.time() - start_time)
+        return response
+    
+    async def generate_content_async(self, content_parts: List, generation_config: Dict = None):
+        fingerprint = request_fingerprint(content_parts, generation_config)
+        start_time = time.time()
+        response = await self.backend.generate_content_async(content_parts, generation_config)
+        self._save(fingerprint, response.text, time.time() - start_time)
+        return response
+    
+    def _record_stream(self, chunks, fingerprint: str, start_time: float) -> Iterator:
+        """Yield chunks unchanged and save the joined text once the stream ends"""
+        texts = []
+        for chunk in chunks:
+            texts.append(chunk.text)
+            yield chunk
+        self._save(fingerprint, "".join(texts), time.time() - start_time)
+    
+    def _save(self, fingerprint: str, text: str, latency_seconds: float):
+        # Write a temp file first so concurrent writers never mix entries
+        fd, temp_path = tempfile.mkstemp(dir=self.recordings_dir, prefix=".tmp_")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                "fingerprint": fingerprint,
+                "latency_seconds": latency_seconds,
+                "response_text": text
+            }, f, indent=2)
+        os.replace(temp_path, os.path.join(self.recordings_dir, f"{fingerprint}.json"))
+
+
+class ReplayBackend(AnalysisBackend):
+    """Serves recorded responses without any network access"""
+    
+    name = "replay"
+    
+    # Chunks a replayed response is split into when streaming
+    STREAM_CHUNKS = 20
+    
+    def __init__(self, recordings_dir: str = DEFAULT_RECORDINGS_DIR, latency_seconds: Optional[float] = None):
+        """
+        Args:
+            recordings_dir: Directory written by RecordingBackend
+            latency_seconds: Simulated response time (None replays the
+                latency measured while recording)
+        """
+        if not os.path.isdir(recordings_dir):
+            raise FileNotFoundError(f"Recordings directory not found: {recordings_dir}")
+        self.recordings_dir = recordings_dir
+        self.latency_seconds = latency_seconds
+    
+    def generate_content(self, content_parts: List, generation_config: Dict = None, stream: bool = False):
+        recording = self._load(request_fingerprint(content_parts, generation_config))
+        latency = self._latency(recording)
+        
+        if stream:
+            return self._replay_stream(recording["response_text"], latency)
+        
+        time.sleep(latency)
+        return BackendResponse(recording["response_text"])
+    
+    async def generate_content_async(self, content_parts: List, generation_config: Dict = None):
+        recording = self._load(request_fingerprint(content_parts, generation_config))
+        await asyncio.sleep(self._latency(recording))
+        return BackendResponse(recording["response_text"])
+    
+    def _replay_stream(self, text: str, latency: float) -> Iterator[BackendResponse]:
+        """Yield the recorded text in evenly timed chunks"""
+        chunk_size = max(1, -(-len(text) // self.STREAM_CHUNKS))
+        for start in range(0, len(text), chunk_size):
+            time.sleep(latency / self.STREAM_CHUNKS)
+            yield BackendResponse(text[start:start + chunk_size])
+    
+    def _latency(self, recording: Dict) -> float:
+        if self.latency_seconds is not None:
+            return self.latency_seconds
+        return recording.get("latency_seconds", 0.0)
+    
+    def _load(self, fingerprint: str) -> Dict:
+        path = os.path.join(self.recordings_dir, f"{fingerprint}.json")
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise LookupError(
+                f"No recording for request {fingerprint[:12]} in {self.recordings_dir}; "
+                f"record it first with SOP_ANALYSIS_BACKEND=record"
+            ) from None
+
+
+def request_fingerprint(content_parts: List, generation_config: Dict = None) -> str:
+    """
+    SHA-256 identifying a request by its text, images and generation config
+    
+    Args:
+        content_parts: Prompt strings and {"mime_type", "data"} image blobs
+        generation_config: Sampling settings of the request
+    
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(generation_config or {}, sort_keys=True).encode('utf-8'))
+    for part in content_parts:
+        if isinstance(part, str):
+            data = part.encode('utf-8')
+        else:
+            data = bytes(part["data"])
+        # Length prefix keeps different splits from colliding
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def create_backend(
+    model_name: str,
+    name: Optional[str] = None,
+    api_key: Optional[str] = None,
+    recordings_dir: Optional[str] = None,
+    replay_latency: Optional[float] = None
+) -> AnalysisBackend:
+    """
+    Build the backend selected by arguments or environment variables
+    
+    Args:
+        model_name: Gemini model name
+        name: "gemini", "record" or "replay" (default: SOP_ANALYSIS_BACKEND,
+            else "gemini")
+        api_key: Google API key for the live backend
+        recordings_dir: Recordings directory (default: SOP_RECORDINGS_DIR,
+            else "recordings")
+        replay_latency: Simulated latency in seconds for replay (default:
+            SOP_REPLAY_LATENCY, else the recorded latency)
+    
+    Returns:
+        AnalysisBackend instance
+    """
+    name = name or os.getenv("SOP_ANALYSIS_BACKEND", "gemini")
+    recordings_dir = recordings_dir or os.getenv("SOP_RECORDINGS_DIR", DEFAULT_RECORDINGS_DIR)
+    if replay_latency is None and os.getenv("SOP_REPLAY_LATENCY"):
+        replay_latency = float(os.getenv("SOP_REPLAY_LATENCY"))
+    
+    if name == "gemini":
+        return GeminiBackend(model_name, api_key)
+    if name == "record":
+        return RecordingBackend(GeminiBackend(model_name, api_key), recordings_dir)
+    if name == "replay":
+        return ReplayBackend(recordings_dir, replay_latency)
+    raise ValueError(f"Unknown analysis backend: {name} (choose from {', '.join(BACKENDS)})")
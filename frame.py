@@ -0,0 +1,133 @@
+"""
+Frame Module
+Compact container for extracted video frames
+"""
+
+import base64
+from typing import Dict, Optional, Tuple, Union
+
+
+class Frame:
+    """
+    A single extracted video frame holding the raw JPEG bytes
+    
+    Base64 text is only produced when a consumer asks for 'image_data', so
+    the pipeline carries the JPEG once instead of a 33% larger string.
+    Supports dictionary-style access for code written against the old
+    frame dictionaries ({"id", "timestamp", "image_data", "image_path"}).
+    """
+    
+    __slots__ = ("id", "timestamp", "data", "image_path")
+    
+    _KEYS = ("id", "timestamp", "image_data", "image_path")
+    
+    def __init__(
+        self,
+        id: int,
+        timestamp: float,
+        data: Union[bytes, memoryview],
+        image_path: Optional[str] = None
+    ):
+        """
+        Create a frame
+        
+        Args:
+            id: Frame number
+            timestamp: Presentation time in seconds
+            data: Encoded JPEG image (bytes or memoryview)
+            image_path: Path of the saved image, if written to disk
+        """
+        self.id = id
+        self.timestamp = timestamp
+        self.data = data
+        self.image_path = image_path
+    
+    @classmethod
+    def from_dict(cls, frame_info: Dict) -> "Frame":
+        """Create a frame from an old-style frame dictionary"""
+        return cls(
+            id=frame_info.get("id"),
+            timestamp=frame_info["timestamp"],
+            data=base64.b64decode(frame_info["image_data"]),
+            image_path=frame_info.get("image_path")
+        )
+    
+    @property
+    def image_data(self) -> str:
+        """Base64-encoded JPEG (computed on every access, never stored)"""
+        return base64.b64encode(self.data).decode('utf-8')
+    
+    @property
+    def size(self) -> int:
+        """Size of the encoded image in bytes"""
+        return len(self.data)
+    
+    def to_dict(self) -> Dict:
+        """Convert to an old-style frame dictionary"""
+        return {key: self[key] for key in self.keys()}
+    
+    # Dictionary-compatible access for older callers
+    
+    def keys(self):
+        return [key for key in self._KEYS if key != "image_path" or self.image_path]
+    
+    def __contains__(self, key) -> bool:
+        return key in self.keys()
+    
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key == "image_data":
+            self.data = base64.b64decode(value)
+        elif key in self._KEYS:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+    
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+    
+    def __repr__(self) -> str:
+        return f"Frame(id={self.id}, timestamp={self.timestamp:.2f}, size={self.size})"
+
+
+def frame_bytes(frame: Union[Frame, Dict]) -> bytes:
+    """Get the encoded JPEG bytes of a Frame or an old-style frame dictionary"""
+    if isinstance(frame, Frame):
+        return frame.data
+    return base64.b64decode(frame['image_data'])
+
+
+# Start-of-frame markers carry the image size (C4, C8 and CC are other segments)
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_dimensions(data: Union[bytes, memoryview]) -> Tuple[int, int]:
+    """
+    Read (width, height) from a JPEG header without decoding the image
+    
+    Raises:
+        ValueError: If no start-of-frame segment is found
+    """
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            raise ValueError("Invalid JPEG marker")
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers have no length field
+            i += 2
+            continue
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    raise ValueError("No JPEG start-of-frame segment found")
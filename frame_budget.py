@@ -0,0 +1,118 @@
+"""
+Frame Budget Planner Module
+Sizes frame sampling to the video length and the model's token limits
+"""
+
+import math
+from typing import Dict, Optional
+
+
+# Gemini bills images in 768x768 tiles; images whose sides are both at most
+# 384px cost a single tile
+TILE_SIZE = 768
+SMALL_IMAGE_SIZE = 384
+DEFAULT_TOKENS_PER_TILE = 258
+
+DEFAULT_TARGET_FRAMES = 150
+DEFAULT_TOKEN_BUDGET = 120_000
+
+# Candidate analysis widths, best quality first
+CANDIDATE_WIDTHS = (768, 512, 384)
+
+
+def image_tokens(width: int, height: int, tokens_per_tile: int = DEFAULT_TOKENS_PER_TILE) -> int:
+    """
+    Estimate the tokens the model charges for one image
+    
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        tokens_per_tile: Token cost of one image tile for the current model
+    
+    Returns:
+        Estimated token count
+    """
+    if width <= SMALL_IMAGE_SIZE and height <= SMALL_IMAGE_SIZE:
+        return tokens_per_tile
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return tiles * tokens_per_tile
+
+
+def plan_sampling(
+    duration: float,
+    video_width: int,
+    video_height: int,
+    target_frames: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    tokens_per_tile: int = DEFAULT_TOKENS_PER_TILE,
+    min_interval: float = 1.0
+) -> Dict:
+    """
+    Choose interval, resolution and dedup threshold for a video
+    
+    Starts at the sharpest candidate width and steps down only when the
+    token budget cannot fit the target frame count at that width.
+    
+    Args:
+        duration: Video duration in seconds
+        video_width: Source width in pixels
+        video_height: Source height in pixels
+        target_frames: Desired number of frames (default: 150)
+        token_budget: Maximum image tokens per request (default: 120,000)
+        tokens_per_tile: Token cost of one image tile for the current model
+        min_interval: Shortest allowed sampling interval in seconds
+    
+    Returns:
+        Dictionary with:
+        {
+            "interval_seconds": float,
+            "resize_width": int,
+            "max_frames": int,
+            "dedup_distance": int,
+            "tokens_per_image": int,
+            "estimated_image_tokens": int
+        }
+    """
+    target_frames = target_frames or DEFAULT_TARGET_FRAMES
+    token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+    # A short clip cannot yield more frames than the minimum interval allows
+    target_frames = max(1, min(target_frames, int(duration / min_interval) + 1))
+    
+    aspect = video_height / video_width if video_width else 9 / 16
+    for width in CANDIDATE_WIDTHS:
+        width = min(width, video_width or width)
+        tokens_per_image = image_tokens(width, int(width * aspect), tokens_per_tile)
+        frames = min(target_frames, token_budget // tokens_per_image)
+        if frames >= target_frames:
+            break
+    
+    frames = max(1, frames)
+    interval = max(duration / frames, min_interval)
+    
+    # Dense sampling produces more near-identical neighbours, so it can
+    # afford a looser duplicate threshold than sparse sampling
+    if interval <= 2:
+        dedup_distance = 6
+    elif interval <= 5:
+        dedup_distance = 5
+    else:
+        dedup_distance = 4
+    
+    return {
+        "interval_seconds": round(interval, 2),
+        "resize_width": width,
+        "max_frames": frames,
+        "dedup_distance": dedup_distance,
+        "tokens_per_image": tokens_per_image,
+        "estimated_image_tokens": frames * tokens_per_image
+    }
+
+
+def print_plan(plan: Dict, duration: float):
+    """Log the chosen sampling plan"""
+    print(f"✓ Frame plan for {duration:.0f}s video:")
+    print(f"  Interval: {plan['interval_seconds']}s, width {plan['resize_width']}px, "
+          f"up to {plan['max_frames']} frames")
+    print(f"  Image tokens: ~{plan['estimated_image_tokens']:,} "
+          f"({plan['tokens_per_image']} per frame)")
+    print(f"  Dedup distance: {plan['dedup_distance']}")
@@ -0,0 +1,187 @@
+"""
+Frame Cache Module
+Persistent, size-bounded on-disk cache of extracted frames keyed by the
+video's content hash and the sampling parameters
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+from frame import Frame
+
+
+DEFAULT_CACHE_DIR = ".frame_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+# Content hashes keyed by (absolute path, file size, modification time)
+_content_hashes: Dict[tuple, str] = {}
+_hash_lock = threading.Lock()
+
+
+class FrameCache:
+    """LRU cache of extracted frames stored on disk"""
+    
+    INDEX_FILE = "index.json"
+    DATA_FILE = "frames.bin"
+    
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize the frame cache
+        
+        Args:
+            cache_dir: Directory that holds the cache entries
+            max_bytes: Total cache size above which the least recently used
+                entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def make_key(self, video_path: str, params: Dict) -> str:
+        """
+        Build the cache key for a video and its sampling parameters
+        
+        Args:
+            video_path: Path to the video file
+            params: Sampling parameters that affect the extracted frames
+        
+        Returns:
+            Hex digest identifying the cache entry
+        """
+        key_data = json.dumps(
+            {"video": video_content_hash(video_path), "params": params},
+            sort_keys=True
+        )
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[List[Frame]]:
+        """
+        Load cached frames
+        
+        Returns:
+            List of Frame objects, or None on a cache miss
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        index_path = os.path.join(entry_dir, self.INDEX_FILE)
+        
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            with open(os.path.join(entry_dir, self.DATA_FILE), 'rb') as f:
+                data = memoryview(f.read())
+            # Mark as recently used for LRU eviction
+            os.utime(index_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        
+        # Frames share one buffer instead of holding a copy each
+        return [
+            Frame(item["id"], item["timestamp"], data[item["offset"]:item["offset"] + item["length"]])
+            for item in index["frames"]
+        ]
+    
+    def put(self, key: str, frames: List[Frame]):
+        """Store frames under `key` and evict old entries if the cache is too big"""
+        entry_dir = os.path.join(self.cache_dir, key)
+        if os.path.exists(entry_dir):
+            return
+        
+        # Write into a temp directory first so readers never see partial entries
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            index = []
+            offset = 0
+            with open(os.path.join(temp_dir, self.DATA_FILE), 'wb') as f:
+                for frame in frames:
+                    f.write(frame.data)
+                    index.append({
+                        "id": frame.id,
+                        "timestamp": frame.timestamp,
+                        "offset": offset,
+                        "length": frame.size
+                    })
+                    offset += frame.size
+            
+            with open(os.path.join(temp_dir, self.INDEX_FILE), 'w') as f:
+                json.dump({"frames": index}, f)
+            
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+        
+        self._evict()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size of the cache"""
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries)
+        }
+    
+    def _entries(self) -> List[tuple]:
+        """List (path, size, last_used) for every complete cache entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            try:
+                last_used = os.path.getmtime(os.path.join(entry_dir, self.INDEX_FILE))
+                size = os.path.getsize(os.path.join(entry_dir, self.DATA_FILE))
+            except OSError:
+                continue
+            entries.append((entry_dir, size, last_used))
+        return entries
+    
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        
+        for entry_dir, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+
+def video_content_hash(video_path: str) -> str:
+    """
+    SHA-256 of the video file contents
+    
+    Hashed once per process for each (path, size, mtime), so renamed or
+    re-uploaded copies of the same file still share cache entries.
+    """
+    stat = os.stat(video_path)
+    file_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    
+    with _hash_lock:
+        if file_key in _content_hashes:
+            return _content_hashes[file_key]
+    
+    with open(video_path, 'rb') as f:
+        digest = hashlib.file_digest(f, 'sha256').hexdigest()
+    
+    with _hash_lock:
+        _content_hashes[file_key] = digest
+    
+    return digest
+
+
+def print_cache_stats(stats: Dict):
+    """Print frame cache counters"""
+    print(f"  Frame Cache:         {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['entries']} entries ({stats['size_bytes'] / 1024 ** 2:.1f} MB)")
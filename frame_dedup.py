@@ -0,0 +1,120 @@
+"""
+Frame Deduplication Module
+Removes near-identical frames between extraction and AI analysis
+using perceptual hashes (dHash)
+"""
+
+import time
+from typing import List, Dict, Tuple
+
+import cv2
+import numpy as np
+
+from frame import frame_bytes
+
+
+class FrameDeduplicator:
+    """Collapse runs of visually near-identical frames"""
+    
+    def __init__(self, max_distance: int = 5, hash_size: int = 8):
+        """
+        Initialize the deduplicator
+        
+        Args:
+            max_distance: Maximum Hamming distance between two frame hashes
+                for them to count as duplicates (0-64 for the default hash)
+            hash_size: Hash grid size; the hash has hash_size^2 bits
+        """
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+    
+    def deduplicate(self, frames: List) -> Tuple[List, Dict]:
+        """
+        Drop frames that are near-duplicates of the frame that started their run
+        
+        Args:
+            frames: List of Frame objects (or frame dictionaries) in timestamp order
+        
+        Returns:
+            Tuple of (kept_frames, report). The report contains:
+            {
+                "input_frames": int,
+                "kept_frames": int,
+                "dropped_frames": int,
+                "bytes_saved": int,
+                "elapsed_seconds": float,
+                "timestamp_map": {dropped_timestamp: surviving_timestamp}
+            }
+        """
+        start_time = time.perf_counter()
+        
+        image_bytes = [frame_bytes(frame) for frame in frames]
+        hashes = self.compute_hashes(image_bytes)
+        
+        kept = []
+        timestamp_map = {}
+        bytes_saved = 0
+        run_hash = None
+        run_timestamp = None
+        
+        for frame, frame_hash, data in zip(frames, hashes, image_bytes):
+            if run_hash is not None and (frame_hash ^ run_hash).bit_count() <= self.max_distance:
+                timestamp_map[frame['timestamp']] = run_timestamp
+                bytes_saved += len(data)
+                continue
+            
+            # Start a new run with this frame as its survivor
+            run_hash = frame_hash
+            run_timestamp = frame['timestamp']
+            kept.append(frame)
+        
+        report = {
+            "input_frames": len(frames),
+            "kept_frames": len(kept),
+            "dropped_frames": len(frames) - len(kept),
+            "bytes_saved": bytes_saved,
+            "elapsed_seconds": time.perf_counter() - start_time,
+            "timestamp_map": timestamp_map
+        }
+        
+        return kept, report
+    
+    def compute_hashes(self, images: List[bytes]) -> List[int]:
+        """
+        Compute dHash values for a batch of JPEG images
+        
+        Each image is decoded at reduced size straight to grayscale, shrunk to
+        a (hash_size x hash_size+1) grid, and all grids are compared against
+        their horizontal neighbours in a single NumPy pass.
+        
+        Args:
+            images: Encoded JPEG images
+        
+        Returns:
+            One integer hash per image
+        """
+        if not images:
+            return []
+        
+        grid_size = (self.hash_size + 1, self.hash_size)
+        grids = np.empty((len(images), self.hash_size, self.hash_size + 1), dtype=np.uint8)
+        
+        for i, data in enumerate(images):
+            gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if gray is None:
+                raise ValueError(f"Could not decode frame {i} for hashing")
+            grids[i] = cv2.resize(gray, grid_size, interpolation=cv2.INTER_AREA)
+        
+        # Bit is set where brightness increases left to right
+        bits = grids[:, :, 1:] > grids[:, :, :-1]
+        packed = np.packbits(bits.reshape(len(images), -1), axis=1)
+        
+        return [int.from_bytes(row.tobytes(), 'big') for row in packed]
+
+
+def print_dedup_report(report: Dict):
+    """Print a short summary of a deduplication run"""
+    print(f"✓ Deduplicated frames: {report['input_frames']} → {report['kept_frames']} "
+          f"({report['dropped_frames']} near-duplicates removed)")
+    print(f"  Saved: {report['bytes_saved'] / 1024:.1f} KB of image data")
+    print(f"  Time: {report['elapsed_seconds'] * 1000:.1f} ms")
@@ -0,0 +1,111 @@
+"""
+Frame Quality Module
+Cheap vectorized image quality scores used to pick the clearest frames
+"""
+
+from typing import List
+
+import cv2
+import numpy as np
+
+from frame import jpeg_dimensions
+
+
+def decode_gray(images: List[bytes], reduce: int = 2) -> List[np.ndarray]:
+    """
+    Decode JPEG images straight to reduced-size grayscale
+    
+    Args:
+        images: Encoded JPEG images
+        reduce: Downscale factor applied by the JPEG decoder (1, 2, 4 or 8)
+    
+    Returns:
+        One 2-D uint8 array per image
+    """
+    flags = {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+    }[reduce]
+    
+    decoded = []
+    for i, data in enumerate(images):
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+        if gray is None:
+            raise ValueError(f"Could not decode image {i}")
+        decoded.append(gray)
+    return decoded
+
+
+def decode_gray_to_width(images: List[bytes], width: int) -> List[np.ndarray]:
+    """
+    Decode JPEG images to grayscale at one common width
+    
+    The decoder downscales while the image stays at least twice `width`,
+    and area averaging does the rest. Every image larger than `width` thus
+    gets the same kind of final downscale, which keeps sharpness scores of
+    different source resolutions comparable.
+    
+    Args:
+        images: Encoded JPEG images
+        width: Width of the decoded images
+    
+    Returns:
+        One 2-D uint8 array per image
+    """
+    decoded = []
+    for data in images:
+        image_width, _ = jpeg_dimensions(data)
+        reduce = next((factor for factor in (8, 4, 2) if image_width // factor >= 2 * width), 1)
+        gray = decode_gray([data], reduce)[0]
+        if gray.shape[1] != width:
+            height = max(1, round(gray.shape[0] * width / gray.shape[1]))
+            gray = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+        decoded.append(gray)
+    return decoded
+
+
+def sharpness_scores(images: List[bytes], reduce: int = 2) -> np.ndarray:
+    """
+    Score images by the variance of their Laplacian (higher = sharper)
+    
+    Motion blur removes high-frequency detail, which shows up as a low
+    Laplacian variance. Images of the same size are scored together in a
+    single NumPy pass.
+    
+    Args:
+        images: Encoded JPEG images
+        reduce: Downscale factor applied before scoring
+    
+    Returns:
+        Array with one score per image
+    """
+    if not images:
+        return np.empty(0)
+    
+    return gray_sharpness(decode_gray(images, reduce))
+
+
+def gray_sharpness(grays: List[np.ndarray]) -> np.ndarray:
+    """
+    Laplacian variance of already decoded grayscale images
+    
+    Only comparable between images decoded at the same width (see
+    decode_gray_to_width).
+    """
+    if all(gray.shape == grays[0].shape for gray in grays):
+        return _laplacian_variance(np.stack(grays))
+    
+    return np.concatenate([_laplacian_variance(gray[np.newaxis]) for gray in grays])
+
+
+def _laplacian_variance(batch: np.ndarray) -> np.ndarray:
+    """Laplacian variance for a (N, H, W) batch of grayscale images"""
+    batch = batch.astype(np.float32)
+    laplacian = (
+        batch[:, :-2, 1:-1] + batch[:, 2:, 1:-1]
+        + batch[:, 1:-1, :-2] + batch[:, 1:-1, 2:]
+        - 4 * batch[:, 1:-1, 1:-1]
+    )
+    return laplacian.reshape(len(batch), -1).var(axis=1)
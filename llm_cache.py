@@ -0,0 +1,170 @@
+"""
+LLM Response Cache Module
+Persistent on-disk cache of parsed SOP responses keyed by the exact request
+sent to the model (frames, prompt, model name and generation config)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+DEFAULT_CACHE_DIR = ".llm_cache"
+DEFAULT_MAX_BYTES = 100 * 1024 ** 2  # 100 MB
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600  # 30 days
+
+
+class ResponseCache:
+    """LRU cache of parsed model responses stored as JSON files"""
+    
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS
+    ):
+        """
+        Initialize the response cache
+        
+        Args:
+            cache_dir: Directory that holds the cache entries
+            max_bytes: Total cache size above which the least recently used
+                entries are evicted
+            ttl_seconds: Age after which an entry is treated as a miss
+                (None keeps entries forever)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(images: List[bytes], prompt: str, model_name: str, generation_config: Dict) -> str:
+        """
+        Build the cache key for one model request
+        
+        Args:
+            images: Encoded images in the order they are sent
+            prompt: Rendered prompt text
+            model_name: Name of the model
+            generation_config: Sampling settings of the request
+        
+        Returns:
+            Hex digest identifying the cache entry
+        """
+        digest = hashlib.sha256()
+        header = json.dumps(
+            {"model": model_name, "config": generation_config, "prompt": prompt},
+            sort_keys=True
+        )
+        digest.update(header.encode('utf-8'))
+        for data in images:
+            # Length prefix keeps different image splits from colliding
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Load a cached response
+        
+        Returns:
+            Parsed SOP dictionary, or None on a miss or expired entry
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            expired = (
+                self.ttl_seconds is not None
+                and time.time() - entry["created"] > self.ttl_seconds
+            )
+            if not expired:
+                # Mark as recently used for LRU eviction
+                os.utime(path)
+        except (OSError, ValueError, KeyError):
+            entry, expired = None, True
+        
+        with self._lock:
+            if expired:
+                self.misses += 1
+                return None
+            self.hits += 1
+        
+        return entry["response"]
+    
+    def put(self, key: str, response: Dict):
+        """Store a parsed response and evict old entries if the cache is too big"""
+        entry = {"created": time.time(), "response": response}
+        
+        # Write a temp file first so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        
+        self._evict()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size of the cache"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries)
+        }
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def _entries(self) -> List[tuple]:
+        """List (path, size, last_used) for every cache entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+    
+    def _evict(self):
+        """Remove expired entries, then least recently used ones until the cache fits"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        # Reads refresh mtime, so an entry untouched for a whole TTL is expired
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds is not None else None
+        
+        for path, size, last_used in entries:
+            if total <= self.max_bytes and (cutoff is None or last_used >= cutoff):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def print_response_cache_stats(stats: Dict):
+    """Print LLM response cache counters"""
+    print(f"  LLM Cache:           {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries "
+          f"({stats['size_bytes'] / 1024 ** 2:.1f} MB)")
@@ -6,12 +6,22 @@ Main application file that orchestrates the entire pipeline
 import os
 import sys
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 from video_processor import VideoFrameExtractor
 from sop_analyzer import SOPAnalyzer
 from pdf_generator import SOPPDFGenerator
+from frame_dedup import FrameDeduplicator, print_dedup_report
+from frame import Frame, frame_bytes
+from frame_budget import plan_sampling, print_plan
+from frame_cache import FrameCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, print_cache_stats
+from llm_cache import ResponseCache, print_response_cache_stats
+from llm_cache import DEFAULT_CACHE_DIR as DEFAULT_LLM_CACHE_DIR
+from rate_limiter import RateLimiter
+from analysis_backends import AnalysisBackend, BACKENDS, create_backend
 from datetime import datetime
 
 # Load environment variables
@@ -21,10 +31,120 @@ load_dotenv()
 class VideoToSOPGenerator:
     """Main application class for Video-to-SOP generation"""
     
-    def __init__(self):
-        """Initialize the generator"""
-        self.video_processor = VideoFrameExtractor(interval_seconds=2)
-        self.analyzer = SOPAnalyzer()
+    def __init__(
+        self,
+        interval_seconds: float = None,
+        sampling_mode: str = "interval",
+        max_frames: int = None,
+        dedup_distance: int = None,
+        workers: int = None,
+        analysis_width: int = None,
+        hires_step_images: bool = False,
+        step_image_width: int = None,
+        frame_cache_dir: str = DEFAULT_CACHE_DIR,
+        frame_cache_max_mb: int = DEFAULT_MAX_BYTES // 1024 ** 2,
+        dedup: bool = True,
+        frame_budget: int = None,
+        token_budget: int = None,
+        sharpest_of: int = 1,
+        analysis_mode: str = "single",
+        window_size: int = 40,
+        analysis_workers: int = 4,
+        transcription_chunk_seconds: float = 300,
+        transcription_workers: int = 4,
+        llm_cache_dir: str = DEFAULT_LLM_CACHE_DIR,
+        refresh_llm_cache: bool = False,
+        stream: bool = False,
+        max_request_tokens: int = SOPAnalyzer.MAX_REQUEST_TOKENS,
+        backend: AnalysisBackend = None
+    ):
+        """
+        Initialize the generator
+        
+        Args:
+            interval_seconds: Frame sampling interval in seconds (None plans
+                interval, width and dedup threshold from the video length)
+            sampling_mode: "interval", "scene" (sample at visual changes) or
+                "keyframe" (decode keyframes only, for very long videos)
+            max_frames: Optional frame budget for scene sampling
+            dedup_distance: Hamming distance for near-duplicate frame removal
+                (None uses the planned value, or 5 without a plan)
+            workers: Parallel FFmpeg decoders for interval sampling
+                (defaults to the CPU core count)
+            analysis_width: Width of the frames sent to the AI
+                (None uses the planned width, or 512 without a plan)
+            hires_step_images: Re-extract only the chosen step images at high
+                resolution for the PDF, so analysis can use small frames
+            step_image_width: Width of the re-extracted step images
+                (None keeps the full video resolution)
+            frame_cache_dir: Directory of the persistent frame cache
+                (None disables caching)
+            frame_cache_max_mb: Size limit of the frame cache in MB
+            dedup: Remove near-duplicate frames before analysis
+            frame_budget: Target number of frames for the sampling plan
+            token_budget: Image token budget per request for the sampling plan
+            sharpest_of: Candidate frames decoded per interval; only the
+                sharpest is kept (1 disables)
+            analysis_mode: "single" (one AI request), "windowed" (parallel
+                requests over overlapping frame windows, for long videos) or
+                "two-pass" (segment on thumbnails, then refine with
+                high-resolution frames around each step)
+            window_size: Frames per window in windowed mode
+            analysis_workers: Windows analyzed at once in windowed mode
+            transcription_chunk_seconds: Longest audio sent in one
+                transcription request; longer audio is split at silences
+            transcription_workers: Audio chunks transcribed at once
+            llm_cache_dir: Directory of the AI response cache
+                (None disables caching)
+            refresh_llm_cache: Ignore cached AI responses and store fresh ones
+            stream: Stream the AI response and handle each step as soon as
+                it is generated (single analysis mode)
+            max_request_tokens: Estimated token budget per AI request; larger
+                requests are compacted before sending
+            backend: Model backend for the analysis (None uses the one
+                selected by SOP_ANALYSIS_BACKEND)
+        """
+        self.plan_sampling = interval_seconds is None
+        self.analysis_width = analysis_width
+        self.max_frames = max_frames
+        self.dedup_distance = dedup_distance
+        self.frame_budget = frame_budget
+        self.token_budget = token_budget
+        self.hires_step_images = hires_step_images
+        self.step_image_width = step_image_width
+        self.frame_cache = (
+            FrameCache(frame_cache_dir, max_bytes=frame_cache_max_mb * 1024 ** 2)
+            if frame_cache_dir else None
+        )
+        self.video_processor = VideoFrameExtractor(
+            interval_seconds=interval_seconds or 2,
+            # Two-pass analysis segments on thumbnails and fetches detail later
+            resize_width=analysis_width or (SOPAnalyzer.THUMBNAIL_WIDTH if analysis_mode == "two-pass" else 512),
+            sampling_mode=sampling_mode,
+            max_frames=max_frames,
+            workers=workers,
+            cache=self.frame_cache,
+            sharpest_of=sharpest_of
+        )
+        self.deduplicator = (
+            FrameDeduplicator(max_distance=dedup_distance if dedup_distance is not None else 5)
+            if dedup else None
+        )
+        self.analysis_mode = analysis_mode
+        self.stream = stream
+        self.window_size = window_size
+        self.analysis_workers = analysis_workers
+        self.transcription_chunk_seconds = transcription_chunk_seconds
+        self.transcription_workers = transcription_workers
+        self.refresh_llm_cache = refresh_llm_cache
+        self.llm_cache = ResponseCache(llm_cache_dir) if llm_cache_dir else None
+        # Limits from SOP_RATE_LIMIT_RPM / SOP_RATE_LIMIT_TPM (shared via SOP_RATE_LIMIT_DB)
+        self.analyzer = SOPAnalyzer(
+            model=backend,
+            cache=self.llm_cache,
+            rate_limiter=RateLimiter.from_env(),
+            max_request_tokens=max_request_tokens
+        )
         self.pdf_generator = SOPPDFGenerator()
     
     def generate_sop(
@@ -65,6 +185,15 @@ class VideoToSOPGenerator:
         print(f"  Duration: {video_info['duration']:.2f} seconds")
         print(f"  Resolution: {video_info['resolution']}")
         print(f"  FPS: {video_info['fps']:.2f}")
+        if video_info['video_codec']:
+            print(f"  Codec: {video_info['video_codec']} ({video_info['container']})")
+        if video_info['has_audio'] is False:
+            print("  Audio: none")
+        
+        # Size sampling to the video length and the model's token limits
+        if self.plan_sampling:
+            print()
+            self._apply_sampling_plan(video_info)
         
         # Step 1: Process video
         print("\n" + "=" * 60)
@@ -77,8 +206,15 @@ class VideoToSOPGenerator:
         try:
             from whisper_transcription import transcribe_video_audio
             groq_api_key = os.getenv("GROQ_API_KEY")
-            if groq_api_key:
-                audio_transcript = transcribe_video_audio(video_path, groq_api_key) or ""
+            if video_info['has_audio'] is False:
+                print("⚠️  Video has no audio stream, skipping audio transcription")
+            elif groq_api_key:
+                audio_transcript = transcribe_video_audio(
+                    video_path,
+                    groq_api_key,
+                    max_chunk_seconds=self.transcription_chunk_seconds,
+                    max_workers=self.transcription_workers
+                ) or ""
                 if audio_transcript:
                     audio_elapsed = time.time() - audio_start_time
                     print(f"✓ Audio transcript extracted: {len(audio_transcript)} characters")
@@ -93,32 +229,113 @@ class VideoToSOPGenerator:
         
         print("\nExtracting frames from video...")
         
-        # Create temp directory for frames
-        frames_dir = "extracted_frames"
-        os.makedirs(frames_dir, exist_ok=True)
-        
-        # Time frame extraction
+        # Time frame extraction (frames stay in memory; repeat runs are
+        # served from the frame cache instead of a frames directory)
         frame_start_time = time.time()
-        frames = self.video_processor.extract_frames(
-            video_path,
-            output_dir=frames_dir
-        )
+        frames = self.video_processor.extract_frames(video_path)
         frame_elapsed = time.time() - frame_start_time
         
         print(f"\n✓ Extracted {len(frames)} frames")
         print(f"  Time: {int(frame_elapsed // 60)}m {int(frame_elapsed % 60)}s")
         
+        # Step 1b: Remove near-duplicate frames before analysis
+        timestamp_map = {}
+        dedup_elapsed = 0
+        if self.deduplicator:
+            print("\nRemoving near-duplicate frames...")
+            frames, dedup_report = self.deduplicator.deduplicate(frames)
+            timestamp_map = dedup_report['timestamp_map']
+            dedup_elapsed = dedup_report['elapsed_seconds']
+            print_dedup_report(dedup_report)
+        
         # Step 2: Analyze with AI
         print("\n" + "=" * 60)
         print("STEP 2: AI ANALYSIS (with Audio Transcript)")
         print("=" * 60)
         analysis_start_time = time.time()
-        sop_data = self.analyzer.analyze_video_frames(frames, context, audio_transcript)
+        step_image_futures = {}
+        if self.analysis_mode == "windowed":
+            sop_data = self.analyzer.analyze_video_frames_windowed(
+                frames,
+                context,
+                audio_transcript,
+                window_size=self.window_size,
+                max_workers=self.analysis_workers,
+                use_cache=not self.refresh_llm_cache
+            )
+        elif self.analysis_mode == "two-pass":
+            sop_data = self.analyzer.analyze_video_frames_two_pass(
+                frames,
+                lambda timestamps: self.video_processor.extract_frames_at_timestamps(
+                    video_path,
+                    timestamps,
+                    resize_width=SOPAnalyzer.REFINE_WIDTH
+                ),
+                context,
+                audio_transcript,
+                use_cache=not self.refresh_llm_cache,
+                # Last decodable frame, so refinement frames can reach the end
+                video_duration=self._step_image_timestamp(video_path, video_info['duration'])
+            )
+        elif self.stream:
+            image_executor = ThreadPoolExecutor(max_workers=1) if self.hires_step_images else None
+            
+            def on_step(step: Dict):
+                timestamp = step.get('timestamp_seconds', 0)
+                print(f"  → Step {step.get('step_number', '?')} at {timestamp:.1f}s: "
+                      f"{step.get('instruction', '')[:60]}")
+                if image_executor:
+                    # Grab the high-resolution image while the model keeps writing
+                    step_image_futures[timestamp] = image_executor.submit(
+                        self.video_processor.extract_frames_at_timestamps,
+                        video_path,
+                        [self._step_image_timestamp(video_path, timestamp)],
+                        resize_width=self.step_image_width
+                    )
+            
+            try:
+                sop_data = self.analyzer.analyze_video_frames_streaming(
+                    frames,
+                    context,
+                    audio_transcript,
+                    on_step=on_step,
+                    use_cache=not self.refresh_llm_cache
+                )
+            finally:
+                if image_executor:
+                    image_executor.shutdown(wait=False)
+        else:
+            sop_data = self.analyzer.analyze_video_frames(
+                frames,
+                context,
+                audio_transcript,
+                use_cache=not self.refresh_llm_cache
+            )
         analysis_elapsed = time.time() - analysis_start_time
         
         print(f"\n✓ Generated SOP: {sop_data['title']}")
         print(f"  Total steps: {len(sop_data['steps'])}")
         print(f"  Time: {int(analysis_elapsed // 60)}m {int(analysis_elapsed % 60)}s")
+        first_step_elapsed = self.analyzer.last_timings['first_step'] if self.stream else None
+        if first_step_elapsed is not None:
+            print(f"  Time to first step: {first_step_elapsed:.1f}s")
+        
+        # Step 2b: Re-extract just the chosen step images at high resolution
+        pdf_frames = frames
+        rerank_images = True
+        if self.analysis_mode == "two-pass":
+            # Sharper refinement frames replace thumbnails at the same timestamps
+            pdf_frames = frames + self.analyzer.last_refined_frames
+        step_image_elapsed = 0
+        if self.hires_step_images and sop_data['steps']:
+            print("\nExtracting high-resolution step images...")
+            step_image_start_time = time.time()
+            pdf_frames = self._extract_step_frames(video_path, sop_data['steps'], frames, step_image_futures)
+            # Step timestamps now match the frames exactly
+            timestamp_map = {}
+            rerank_images = False
+            step_image_elapsed = time.time() - step_image_start_time
+            print(f"✓ Extracted {len(pdf_frames)} step images in {step_image_elapsed:.1f}s")
 
         # Step 3: Generate PDF
         print("\n" + "=" * 60)
@@ -129,35 +346,17 @@ class VideoToSOPGenerator:
         # Pass the extracted frames to PDF generator
         self.pdf_generator.generate_sop_pdf(
             sop_data,
-            frames,  # Pass frames instead of video_path
+            pdf_frames,  # Pass frames instead of video_path
             output_pdf,
-            company_name
+            company_name,
+            timestamp_map=timestamp_map,
+            rerank_images=rerank_images
         )
         pdf_elapsed = time.time() - pdf_start_time
         
         # Calculate total time
         total_elapsed = time.time() - total_start_time
         
-        # Step 4: Cleanup extracted frames
-        print("\n" + "=" * 60)
-        print("STEP 4: CLEANUP")
-        print("=" * 60)
-        
-        try:
-            import shutil
-            if os.path.exists(frames_dir):
-                # Count frames before deletion
-                frame_count = len(os.listdir(frames_dir))
-                # Delete the entire directory
-                shutil.rmtree(frames_dir)
-                print(f"✓ Deleted {frame_count} extracted frames from '{frames_dir}/'")
-                print("  (Prevents mixing old and new frames on next run)")
-            else:
-                print(f"⚠️  No frames directory found to clean up")
-        except Exception as e:
-            print(f"⚠️  Could not delete extracted frames: {e}")
-            print("   (You may need to manually delete the 'extracted_frames' folder)")
-        
         print("\n" + "=" * 60)
         print("COMPLETE!")
         print("=" * 60)
@@ -170,13 +369,123 @@ class VideoToSOPGenerator:
         if audio_transcript:
             print(f"  Audio Transcription: {int(audio_elapsed // 60)}m {int(audio_elapsed % 60)}s")
         print(f"  Frame Extraction:    {int(frame_elapsed // 60)}m {int(frame_elapsed % 60)}s")
+        if self.video_processor.sharpest_of > 1:
+            scoring_elapsed = self.video_processor.last_timings['sharpness_scoring']
+            print(f"  Sharpness Scoring:   {scoring_elapsed * 1000:.0f}ms")
+        if self.deduplicator:
+            print(f"  Deduplication:       {dedup_elapsed * 1000:.0f}ms")
         print(f"  AI Analysis:         {int(analysis_elapsed // 60)}m {int(analysis_elapsed % 60)}s")
+        if first_step_elapsed is not None:
+            print(f"    First Step:        {first_step_elapsed:.1f}s")
+        if step_image_elapsed:
+            print(f"  Step Images:         {int(step_image_elapsed // 60)}m {int(step_image_elapsed % 60)}s")
         print(f"  PDF Generation:      {int(pdf_elapsed // 60)}m {int(pdf_elapsed % 60)}s")
         print(f"  {'─' * 58}")
         print(f"  TOTAL TIME:          {int(total_elapsed // 60)}m {int(total_elapsed % 60)}s")
+        if self.frame_cache:
+            print_cache_stats(self.frame_cache.stats())
+        if self.llm_cache:
+            print_response_cache_stats(self.llm_cache.stats())
         print("=" * 60)
         
         return sop_data
+    
+    def _apply_sampling_plan(self, video_info: Dict):
+        """Configure interval, width and dedup threshold from a frame budget plan"""
+        plan = plan_sampling(
+            video_info['duration'],
+            video_info['width'],
+            video_info['height'],
+            target_frames=self.frame_budget,
+            token_budget=self.token_budget,
+            tokens_per_tile=self.analyzer.image_tile_tokens
+        )
+        
+        # Explicit settings always win over the plan
+        self.video_processor.interval_seconds = plan['interval_seconds']
+        if self.analysis_width is None and self.analysis_mode != "two-pass":
+            self.video_processor.resize_width = plan['resize_width']
+        if self.max_frames is None and self.video_processor.sampling_mode == "scene":
+            self.video_processor.max_frames = plan['max_frames']
+        if self.deduplicator and self.dedup_distance is None:
+            self.deduplicator.max_distance = plan['dedup_distance']
+        
+        print_plan(plan, video_info['duration'])
+    
+    def _extract_step_frames(
+        self,
+        video_path: str,
+        steps: List[Dict],
+        frames: List[Frame],
+        prefetched: Dict[float, Future] = None
+    ) -> List[Frame]:
+        """
+        Extract one high-resolution frame at each step's chosen timestamp
+        
+        Images already fetched while the response was streaming are reused;
+        the rest are extracted in one pass. A step whose image cannot be
+        extracted gets the nearest analysis frame instead.
+        """
+        prefetched = prefetched or {}
+        timestamps = [step.get('timestamp_seconds', 0) for step in steps]
+        
+        missing = [timestamp for timestamp in timestamps if timestamp not in prefetched]
+        extracted = self._extract_step_images(video_path, missing) if missing else {}
+        
+        images = []
+        for timestamp in timestamps:
+            image = _prefetched_image(prefetched[timestamp]) if timestamp in prefetched else extracted[timestamp]
+            if image is None:
+                print(f"⚠️  Could not extract step image at {timestamp:.1f}s, using the analysis frame")
+                image = frame_bytes(min(frames, key=lambda frame: abs(frame['timestamp'] - timestamp)))
+            images.append(image)
+        
+        return [
+            Frame(i + 1, timestamp, image)
+            for i, (timestamp, image) in enumerate(zip(timestamps, images))
+        ]
+    
+    def _extract_step_images(self, video_path: str, timestamps: List[float]) -> Dict[float, bytes]:
+        """
+        High-resolution images at step timestamps, keyed by the requested
+        timestamp (None where extraction failed)
+        """
+        clamped = [self._step_image_timestamp(video_path, timestamp) for timestamp in timestamps]
+        try:
+            images = self.video_processor.extract_frames_at_timestamps(
+                video_path,
+                clamped,
+                resize_width=self.step_image_width
+            )
+        except ValueError:
+            # One unreadable frame fails the whole pass; retry each on its own
+            images = []
+            for timestamp in clamped:
+                try:
+                    images.append(self.video_processor.extract_frames_at_timestamps(
+                        video_path,
+                        [timestamp],
+                        resize_width=self.step_image_width
+                    )[0])
+                except ValueError:
+                    images.append(None)
+        return dict(zip(timestamps, images))
+    
+    def _step_image_timestamp(self, video_path: str, timestamp: float) -> float:
+        """Clamp a model-chosen timestamp to the video's last decodable frame"""
+        video_info = self.video_processor.get_video_info(video_path)
+        if video_info['duration'] <= 0:
+            return max(0.0, timestamp)
+        frame_duration = 1 / video_info['fps'] if video_info['fps'] > 0 else 0
+        return min(max(0.0, timestamp), max(0.0, video_info['duration'] - frame_duration))
+
+
+def _prefetched_image(future: Future) -> Optional[bytes]:
+    """Result of a streaming step image prefetch (None if it failed)"""
+    try:
+        return future.result()[0]
+    except ValueError:
+        return None
 
 
 def main():
@@ -205,18 +514,215 @@ def main():
         default="Your Company",
         help="Company name for PDF header"
     )
+    parser.add_argument(
+        "--sampling",
+        choices=VideoFrameExtractor.SAMPLING_MODES,
+        default="interval",
+        help="Frame sampling mode: fixed interval, scene changes, or keyframes only "
+             "for very long videos (default: interval)"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        help="Seconds between sampled frames in interval/keyframe mode "
+             "(default: planned from video length and token budget)"
+    )
+    parser.add_argument(
+        "--max-frames",
+        type=int,
+        default=None,
+        help="Maximum number of frames to send for analysis (scene mode)"
+    )
+    parser.add_argument(
+        "--dedup-distance",
+        type=int,
+        default=None,
+        help="Max Hamming distance (0-64) for near-duplicate frame removal (default: planned)"
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Send every extracted frame to the AI, even near-duplicates"
+    )
+    parser.add_argument(
+        "--sharpest-of",
+        type=int,
+        default=1,
+        help="Decode N candidate frames per interval and keep the sharpest (default: 1)"
+    )
+    parser.add_argument(
+        "--frame-budget",
+        type=int,
+        default=None,
+        help="Target number of frames when planning the sampling (default: 150)"
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=None,
+        help="Image token budget per AI request when planning the sampling (default: 120000)"
+    )
+    parser.add_argument(
+        "--analysis-mode",
+        choices=("single", "windowed", "two-pass"),
+        default="single",
+        help="Analyze all frames in one request, long videos in parallel overlapping "
+             "windows, or in two passes: thumbnails to find the steps, then "
+             "high-resolution frames around them (default: single)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the AI response and process each step as soon as it is generated"
+    )
+    parser.add_argument(
+        "--max-request-tokens",
+        type=int,
+        default=SOPAnalyzer.MAX_REQUEST_TOKENS,
+        help="Token budget per AI request; larger requests drop distant transcript lines "
+             f"and frames (default: {SOPAnalyzer.MAX_REQUEST_TOKENS})"
+    )
+    parser.add_argument(
+        "--window-size",
+        type=int,
+        default=40,
+        help="Frames per window in windowed analysis (default: 40)"
+    )
+    parser.add_argument(
+        "--analysis-workers",
+        type=int,
+        default=4,
+        help="Windows analyzed concurrently in windowed analysis (default: 4)"
+    )
+    parser.add_argument(
+        "--transcription-chunk-seconds",
+        type=float,
+        default=300,
+        help="Longest audio per transcription request; longer audio is split at "
+             "silences and the chunks transcribed in parallel (default: 300)"
+    )
+    parser.add_argument(
+        "--transcription-workers",
+        type=int,
+        default=4,
+        help="Audio chunks transcribed concurrently (default: 4)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Parallel FFmpeg decoders for frame extraction (default: CPU core count)"
+    )
+    parser.add_argument(
+        "--analysis-width",
+        type=int,
+        default=None,
+        help="Width in pixels of the frames sent to the AI (default: planned)"
+    )
+    parser.add_argument(
+        "--hires-steps",
+        action="store_true",
+        help="Re-extract the chosen step images at high resolution for the PDF"
+    )
+    parser.add_argument(
+        "--step-image-width",
+        type=int,
+        default=None,
+        help="Width of high-resolution step images (default: full video resolution)"
+    )
+    parser.add_argument(
+        "--frame-cache-dir",
+        default=os.getenv("SOP_FRAME_CACHE_DIR", DEFAULT_CACHE_DIR),
+        help=f"Directory of the persistent frame cache (default: {DEFAULT_CACHE_DIR})"
+    )
+    parser.add_argument(
+        "--frame-cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // 1024 ** 2,
+        help="Frame cache size limit in MB (default: 2048)"
+    )
+    parser.add_argument(
+        "--no-frame-cache",
+        action="store_true",
+        help="Always decode the video, ignoring the frame cache"
+    )
+    parser.add_argument(
+        "--llm-cache-dir",
+        default=os.getenv("SOP_LLM_CACHE_DIR", DEFAULT_LLM_CACHE_DIR),
+        help=f"Directory of the AI response cache (default: {DEFAULT_LLM_CACHE_DIR})"
+    )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="Disable the AI response cache"
+    )
+    parser.add_argument(
+        "--refresh-llm-cache",
+        action="store_true",
+        help="Call the AI even when a cached response exists, and store the new one"
+    )
+    
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=os.getenv("SOP_ANALYSIS_BACKEND", "gemini"),
+        help="AI backend: live Gemini, Gemini with every response recorded, or replay "
+             "of recorded responses without network access (default: gemini)"
+    )
+    parser.add_argument(
+        "--recordings-dir",
+        default=os.getenv("SOP_RECORDINGS_DIR", "recordings"),
+        help="Directory of recorded AI responses for --backend record/replay (default: recordings)"
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=None,
+        help="Simulated AI response time in seconds when replaying (default: recorded latency)"
+    )
     
     args = parser.parse_args()
     
-    # Check for API key
-    if not os.getenv("GOOGLE_API_KEY"):
+    # Check for API key (replay runs offline)
+    if args.backend != "replay" and not os.getenv("GOOGLE_API_KEY"):
         print("ERROR: GOOGLE_API_KEY not found!")
         print("Please create a .env file with your API key:")
         print("  GOOGLE_API_KEY=your_api_key_here")
         sys.exit(1)
     
     # Create generator
-    generator = VideoToSOPGenerator()
+    generator = VideoToSOPGenerator(
+        interval_seconds=args.interval,
+        sampling_mode=args.sampling,
+        max_frames=args.max_frames,
+        dedup_distance=args.dedup_distance,
+        workers=args.workers,
+        analysis_width=args.analysis_width,
+        hires_step_images=args.hires_steps,
+        step_image_width=args.step_image_width,
+        frame_cache_dir=None if args.no_frame_cache else args.frame_cache_dir,
+        frame_cache_max_mb=args.frame_cache_size,
+        dedup=not args.no_dedup,
+        frame_budget=args.frame_budget,
+        token_budget=args.token_budget,
+        sharpest_of=args.sharpest_of,
+        analysis_mode=args.analysis_mode,
+        window_size=args.window_size,
+        analysis_workers=args.analysis_workers,
+        transcription_chunk_seconds=args.transcription_chunk_seconds,
+        transcription_workers=args.transcription_workers,
+        llm_cache_dir=None if args.no_llm_cache else args.llm_cache_dir,
+        refresh_llm_cache=args.refresh_llm_cache,
+        stream=args.stream,
+        max_request_tokens=args.max_request_tokens,
+        backend=create_backend(
+            SOPAnalyzer.MODEL_NAME,
+            args.backend,
+            recordings_dir=args.recordings_dir,
+            replay_latency=args.replay_latency
+        )
+    )
     
     try:
         # Generate SOP
@@ -4,7 +4,6 @@ Creates professional SOP PDF documents with images and structured content
 """
 
 import os
-import base64
 import tempfile
 from datetime import datetime
 from typing import Dict, List
@@ -18,6 +17,9 @@ from reportlab.platypus import (
     PageBreak, Table, TableStyle, KeepTogether
 )
 
+from frame import frame_bytes
+from step_images import StepImageSelector
+
 
 class SOPPDFGenerator:
     """Generate professional SOP PDF documents"""
@@ -96,16 +98,22 @@ class SOPPDFGenerator:
         sop_data: Dict, 
         frames: List[Dict],
         output_path: str,
-        company_name: str = "Your Company"
+        company_name: str = "Your Company",
+        timestamp_map: Dict[float, float] = None,
+        rerank_images: bool = True
     ):
         """
         Generate SOP PDF from structured data
         
         Args:
             sop_data: Dictionary containing SOP structure
-            frames: List of extracted frames (with 'image_data' and 'timestamp')
+            frames: List of extracted Frame objects (or dictionaries with 'image_data' and 'timestamp')
             output_path: Output PDF file path
             company_name: Company name for header
+            timestamp_map: Optional mapping from timestamps of frames removed
+                by deduplication to the timestamp of the frame that replaced them
+            rerank_images: Pick the sharpest, most distinct frame near each
+                step's timestamp instead of the nearest one
         """
         print(f"Generating PDF: {output_path}")
         
@@ -140,7 +148,7 @@ class SOPPDFGenerator:
                 story.append(PageBreak())
             
             # Add procedure steps
-            story.extend(self._create_steps_section(sop_data, frames))
+            story.extend(self._create_steps_section(sop_data, frames, timestamp_map, rerank_images))
             
             # Build PDF
             doc.build(story)
@@ -255,15 +263,21 @@ class SOPPDFGenerator:
         
         return elements
     
-    def _create_steps_section(self, sop_data: Dict, frames: List[Dict]) -> List:
+    def _create_steps_section(
+        self,
+        sop_data: Dict,
+        frames: List[Dict],
+        timestamp_map: Dict[float, float] = None,
+        rerank_images: bool = True
+    ) -> List:
         """Create procedure steps section with images"""
         elements = []
         
         elements.append(Paragraph("PROCEDURE", self.styles['SectionHeader']))
         elements.append(Spacer(1, 0.2*inch))
         
-        # Create a dictionary mapping timestamps to frames for quick lookup
-        frame_lookup = {frame['timestamp']: frame['image_data'] for frame in frames}
+        # Sorted timestamp index; deduplicated timestamps resolve to their surviving frame
+        image_selector = StepImageSelector(frames, timestamp_map, rerank=rerank_images)
         
         for step in sop_data.get("steps", []):
             step_elements = []
@@ -282,12 +296,12 @@ class SOPPDFGenerator:
             try:
                 timestamp = step.get('timestamp_seconds', 0)
                 
-                # Find the closest frame to the requested timestamp
-                closest_timestamp = min(frame_lookup.keys(), key=lambda t: abs(t - timestamp))
-                frame_data_base64 = frame_lookup[closest_timestamp]
+                # Clearest frame near the requested timestamp that differs
+                # from the previous step's image
+                frame = image_selector.select(timestamp)
                 
-                # Decode base64 image data
-                frame_data = base64.b64decode(frame_data_base64)
+                # Raw JPEG bytes of the chosen frame
+                frame_data = frame_bytes(frame)
                 
                 # Save to temporary file (ReportLab Image needs a file path)
                 with tempfile.NamedTemporaryFile(mode='wb', suffix='.jpg', delete=False) as temp_file:
@@ -303,7 +317,7 @@ class SOPPDFGenerator:
                 step_elements.append(img)
                 
                 # Caption
-                caption = f"Image at {timestamp:.1f} seconds"
+                caption = f"Image at {frame['timestamp']:.1f} seconds"
                 step_elements.append(Paragraph(
                     caption,
                     self.styles['Normal']
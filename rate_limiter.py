@@ -0,0 +1,155 @@
+"""
+Rate Limiter Module
+Token-bucket limiter for model requests per minute and tokens per minute,
+shared by threads in one process or (with a SQLite state file) by every
+worker process on the host
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Optional, Tuple
+
+
+# Gemini 2.5 Pro free-tier limits
+DEFAULT_REQUESTS_PER_MINUTE = 5
+DEFAULT_TOKENS_PER_MINUTE = 250_000
+
+
+class RateLimiter:
+    """Two token buckets (requests and tokens) refilled continuously"""
+    
+    def __init__(
+        self,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        state_path: Optional[str] = None,
+        burst_seconds: float = 60
+    ):
+        """
+        Initialize the limiter
+        
+        Args:
+            requests_per_minute: Sustained request rate
+            tokens_per_minute: Sustained token rate
+            state_path: SQLite file holding the bucket levels so several
+                processes share one budget (None keeps the state in memory)
+            burst_seconds: Seconds of quota that may be spent at once
+                (60 allows a full minute's quota in one burst)
+        """
+        self.rate = {"requests": requests_per_minute / 60, "tokens": tokens_per_minute / 60}
+        self.capacity = {name: rate * burst_seconds for name, rate in self.rate.items()}
+        self.state_path = state_path
+        self.waited_seconds = 0.0
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        
+        if state_path:
+            with closing(self._connect()) as db, db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets "
+                    "(name TEXT PRIMARY KEY, level REAL, updated REAL)"
+                )
+    
+    @classmethod
+    def from_env(cls, default_state_path: Optional[str] = None) -> Optional["RateLimiter"]:
+        """
+        Build a limiter from SOP_RATE_LIMIT_RPM / SOP_RATE_LIMIT_TPM /
+        SOP_RATE_LIMIT_DB (None if no limit is configured and there is no
+        default state path)
+        """
+        rpm = os.getenv("SOP_RATE_LIMIT_RPM")
+        tpm = os.getenv("SOP_RATE_LIMIT_TPM")
+        state_path = os.getenv("SOP_RATE_LIMIT_DB", default_state_path)
+        if not (rpm or tpm or state_path):
+            return None
+        return cls(
+            float(rpm or DEFAULT_REQUESTS_PER_MINUTE),
+            float(tpm or DEFAULT_TOKENS_PER_MINUTE),
+            state_path
+        )
+    
+    def try_acquire(self, tokens: int = 0) -> float:
+        """
+        Take one request and `tokens` tokens if both buckets allow it
+        
+        Returns:
+            0 if the request may go ahead, otherwise the seconds to wait
+            before trying again
+        """
+        # A request larger than the whole bucket could never go through
+        need = {"requests": 1.0, "tokens": min(float(tokens), self.capacity["tokens"])}
+        
+        if self.state_path:
+            return self._try_acquire_shared(need)
+        
+        with self._lock:
+            now = time.time()
+            levels = {name: self._refill(name, *self._buckets.get(name, (None, None)), now) for name in need}
+            wait = self._wait_time(levels, need)
+            if wait == 0:
+                for name in need:
+                    levels[name] -= need[name]
+            for name, level in levels.items():
+                self._buckets[name] = (level, now)
+            return wait
+    
+    def acquire(self, tokens: int = 0):
+        """Block until the request fits in both buckets"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            self.waited_seconds += wait
+            time.sleep(wait)
+    
+    async def acquire_async(self, tokens: int = 0):
+        """Wait (without blocking the event loop) until the request fits"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            self.waited_seconds += wait
+            await asyncio.sleep(wait)
+    
+    def _try_acquire_shared(self, need: Dict[str, float]) -> float:
+        """try_acquire() against the SQLite state file"""
+        with self._lock, closing(self._connect()) as db, db:
+            # Take the write lock up front so workers cannot interleave
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            stored = dict(
+                (name, (level, updated))
+                for name, level, updated in db.execute("SELECT name, level, updated FROM buckets")
+            )
+            levels = {name: self._refill(name, *stored.get(name, (None, None)), now) for name in need}
+            wait = self._wait_time(levels, need)
+            if wait == 0:
+                for name in need:
+                    levels[name] -= need[name]
+            db.executemany(
+                "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                [(name, level, now) for name, level in levels.items()]
+            )
+            return wait
+    
+    def _connect(self) -> sqlite3.Connection:
+        """New connection to the state file (`with db` only ends the transaction; callers close it)"""
+        return sqlite3.connect(self.state_path, timeout=30, isolation_level=None)
+    
+    def _refill(self, name: str, level: Optional[float], updated: Optional[float], now: float) -> float:
+        """Bucket level at `now` (a new bucket starts full)"""
+        if level is None:
+            return self.capacity[name]
+        return min(self.capacity[name], level + (now - updated) * self.rate[name])
+    
+    def _wait_time(self, levels: Dict[str, float], need: Dict[str, float]) -> float:
+        """Seconds until every bucket holds what the request needs"""
+        return max(
+            max(0.0, (need[name] - levels[name]) / self.rate[name])
+            for name in need
+        )
+
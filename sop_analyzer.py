@@ -3,14 +3,23 @@ AI Analyzer Module
 Uses Gemini 2.5 Pro to analyze video frames and generate SOP steps
 """
 
-import os
+import re
 import json
-import io
-import base64
-from typing import List, Dict, Optional
+import time
+import random
+import asyncio
+import bisect
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from PIL import Image
-import google.generativeai as genai
+
+from frame import Frame, frame_bytes, jpeg_dimensions
+from analysis_backends import AnalysisBackend, create_backend
+from frame_budget import image_tokens
+from llm_cache import ResponseCache
+from rate_limiter import RateLimiter
+from step_stream import REQUIRED_STEP_FIELDS, StepStreamParser, salvage_response
 
 # Load environment variables
 load_dotenv()
@@ -19,68 +28,126 @@ load_dotenv()
 class SOPAnalyzer:
     """Analyze video frames and generate Standard Operating Procedures"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    MODEL_NAME = 'gemini-2.5-pro'
+    
+    # Tokens the model charges per 768x768 image tile
+    IMAGE_TILE_TOKENS = 258
+    
+    GENERATION_CONFIG = {
+        "temperature": 0.4,
+        "top_p": 0.95,
+        "max_output_tokens": 8192,
+    }
+    
+    # Retries of rate-limit (429) and server (5xx) errors
+    MAX_RETRIES = 5
+    BACKOFF_BASE_SECONDS = 2.0
+    BACKOFF_MAX_SECONDS = 60.0
+    
+    # Gemini 2.5 Pro bills prompts above 200k tokens at a higher rate, and
+    # inline request data is limited to 20 MB
+    MAX_REQUEST_TOKENS = 200_000
+    MAX_REQUEST_BYTES = 20 * 1024 ** 2
+    
+    # Two-pass analysis: thumbnail width for the segmentation pass, and
+    # frame width, window and frame count around each proposed step
+    THUMBNAIL_WIDTH = 256
+    REFINE_WIDTH = 768
+    REFINE_WINDOW_SECONDS = 2.0
+    REFINE_FRAMES_PER_STEP = 3
+    
+    # Follow-up requests for the rest of a cut-off response
+    MAX_CONTINUATIONS = 2
+    
+    # Transcript segments further than this from every frame can be dropped
+    TRANSCRIPT_MARGIN_SECONDS = 5.0
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: AnalysisBackend = None,
+        cache: ResponseCache = None,
+        rate_limiter: RateLimiter = None,
+        max_concurrent: int = 4,
+        max_request_tokens: int = MAX_REQUEST_TOKENS,
+        max_request_bytes: int = MAX_REQUEST_BYTES
+    ):
         """
         Initialize the SOP Analyzer
         
         Args:
             api_key: Google API key (if not provided, reads from .env)
+            model: Backend that answers requests (any object with a
+                Gemini-style generate_content()); defaults to the backend
+                chosen by SOP_ANALYSIS_BACKEND (the live Gemini API unless
+                set to "record" or "replay")
+            cache: Optional ResponseCache; identical requests reuse the
+                stored SOP instead of calling the model again
+            rate_limiter: Optional RateLimiter shared with other analyzers
+                (and, with a state file, other processes)
+            max_concurrent: Requests one analyzer keeps in flight in async mode
+            max_request_tokens: Estimated token budget per request; larger
+                requests are compacted before sending
+            max_request_bytes: Payload budget per request in bytes
         """
-        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        self.cache = cache
+        self.max_request_tokens = max_request_tokens
+        self.max_request_bytes = max_request_bytes
+        self.last_estimate = None
+        self.rate_limiter = rate_limiter
+        self.max_concurrent = max_concurrent
+        self.retries = 0
+        self.continuations = 0
+        self.last_passes = []
+        self.last_refined_frames = []
+        self.last_timings = {"first_step": None, "total": 0.0}
+        self._semaphore = None
+        self._semaphore_loop = None
+        self.model_name = self.MODEL_NAME
+        self.image_tile_tokens = self.IMAGE_TILE_TOKENS
+        self.generation_config = dict(self.GENERATION_CONFIG)
         
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY not found. Please set it in .env file")
-        
-        # Configure Google API
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-pro')
+        self.model = model if model is not None else create_backend(self.model_name, api_key=api_key)
     
-    def analyze_video_frames(self, frames: List[Dict], context: str = "", audio_transcript: str = "") -> Dict:
+    def analyze_video_frames(
+        self,
+        frames: List[Dict],
+        context: str = "",
+        audio_transcript: str = "",
+        use_cache: bool = True
+    ) -> Dict:
         """
         Analyze video frames and generate SOP
         
         Args:
-            frames: List of frame dictionaries with 'image_data' and 'timestamp'
+            frames: List of Frame objects (or frame dictionaries with 'image_data' and 'timestamp')
             context: Optional context about the task (e.g., "Engine assembly process")
             audio_transcript: Optional audio transcript from the video
+            use_cache: Set to False to skip the cache lookup and always call
+                the model (the fresh response is still stored)
             
         Returns:
             Dictionary containing SOP structure with title, description, and steps
         """
         print("Preparing prompt for Gemini...")
         
-        # Create the prompt
-        prompt = self._create_prompt(frames, context, audio_transcript)
-        
-        # Prepare content for Gemini (text + images)
-        content_parts = [prompt]
-        
-        # Add images to the content
-        for frame in frames:
-            # Decode base64 image data and create PIL Image
-            image_bytes = base64.b64decode(frame['image_data'])
-            image = Image.open(io.BytesIO(image_bytes))
-            content_parts.append(image)
+        cache_key, cached, content_parts = self._prepare_request(frames, context, audio_transcript, use_cache)
+        if cached is not None:
+            return cached
         
-        print(f"Sending {len(frames)} frames to Gemini for analysis...")
+        print(f"Sending {len(content_parts) - 1} frames to Gemini for analysis...")
         
         try:
             # Generate content
-            response = self.model.generate_content(
-                content_parts,
-                generation_config={
-                    "temperature": 0.4,
-                    "top_p": 0.95,
-                    "max_output_tokens": 8192,
-                }
-            )
-            
-            # Extract JSON from response
-            response_text = response.text
+            response_text = self._generate(content_parts)
             print("Received response from Gemini")
             
-            # Parse JSON
-            sop_data = self._parse_response(response_text)
+            # Parse JSON (salvaging a cut-off response)
+            sop_data, finished = self._parse_or_continue(response_text, content_parts)
+            
+            # An incomplete procedure is not worth reusing
+            if cache_key is not None and finished:
+                self.cache.put(cache_key, sop_data)
             
             return sop_data
             
@@ -88,13 +155,562 @@ class SOPAnalyzer:
             print(f"Error during Gemini analysis: {e}")
             raise
     
-    def _create_prompt(self, frames: List[Dict], context: str, audio_transcript: str = "") -> str:
+    def analyze_video_frames_streaming(
+        self,
+        frames: List[Dict],
+        context: str = "",
+        audio_transcript: str = "",
+        on_step: Optional[Callable[[Dict], None]] = None,
+        use_cache: bool = True
+    ) -> Dict:
+        """
+        Analyze video frames, handing each step to `on_step` as it is generated
+        
+        The response is streamed and every completed entry of the "steps"
+        array is parsed immediately, so callers can start on a step before
+        the model finishes. Time to first step and total time are stored
+        in `last_timings`.
+        
+        Args:
+            frames: List of Frame objects
+            context: Optional context about the task
+            audio_transcript: Optional audio transcript from the video
+            on_step: Called with each step dictionary as soon as it is complete
+            use_cache: Set to False to skip the cache lookup
+            
+        Returns:
+            Dictionary containing SOP structure with title, description, and steps
+        """
+        start_time = time.time()
+        self.last_timings = {"first_step": None, "total": 0.0}
+        
+        def emit(step: Dict):
+            if self.last_timings["first_step"] is None:
+                self.last_timings["first_step"] = time.time() - start_time
+            if on_step is not None:
+                on_step(step)
+        
+        print("Preparing prompt for Gemini...")
+        cache_key, cached, content_parts = self._prepare_request(frames, context, audio_transcript, use_cache)
+        if cached is not None:
+            for step in cached['steps']:
+                emit(step)
+            self.last_timings["total"] = time.time() - start_time
+            return cached
+        
+        print(f"Streaming analysis of {len(content_parts) - 1} frames from Gemini...")
+        tokens = self._estimate_tokens(content_parts)
+        
+        for attempt in range(self.MAX_RETRIES + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(tokens)
+            parser = StepStreamParser()
+            try:
+                response = self.model.generate_content(
+                    content_parts,
+                    generation_config=self.generation_config,
+                    stream=True
+                )
+                for chunk in response:
+                    for step in parser.feed(chunk.text):
+                        emit(step)
+                break
+            except Exception as e:
+                # Steps already handed out cannot be taken back, so only
+                # retry while nothing has been emitted
+                if (attempt == self.MAX_RETRIES or not _is_retryable(e)
+                        or self.last_timings["first_step"] is not None):
+                    print(f"Error during Gemini analysis: {e}")
+                    raise
+                self.retries += 1
+                time.sleep(self._backoff_delay(attempt))
+        
+        print("Received response from Gemini")
+        sop_data, finished = self._parse_or_continue(parser.text, content_parts, on_step=emit)
+        self.last_timings["total"] = time.time() - start_time
+        
+        if cache_key is not None and finished:
+            self.cache.put(cache_key, sop_data)
+        
+        return sop_data
+    
+    async def analyze_video_frames_async(
+        self,
+        frames: List[Dict],
+        context: str = "",
+        audio_transcript: str = "",
+        use_cache: bool = True
+    ) -> Dict:
+        """
+        Asyncio version of analyze_video_frames()
+        
+        Requests wait for the rate limiter without blocking the event loop,
+        at most `max_concurrent` are in flight per analyzer, and rate-limit
+        (429) and server (5xx) errors are retried with jittered backoff.
+        
+        Args:
+            frames: List of Frame objects
+            context: Optional context about the task
+            audio_transcript: Optional audio transcript from the video
+            use_cache: Set to False to skip the cache lookup
+            
+        Returns:
+            Dictionary containing SOP structure with title, description, and steps
+        """
+        cache_key, cached, content_parts = self._prepare_request(frames, context, audio_transcript, use_cache)
+        if cached is not None:
+            return cached
+        
+        async with self._get_semaphore():
+            tokens = self._estimate_tokens(content_parts)
+            for attempt in range(self.MAX_RETRIES + 1):
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire_async(tokens)
+                try:
+                    response = await self.model.generate_content_async(
+                        content_parts,
+                        generation_config=self.generation_config
+                    )
+                    break
+                except Exception as e:
+                    if attempt == self.MAX_RETRIES or not _is_retryable(e):
+                        print(f"Error during Gemini analysis: {e}")
+                        raise
+                    self.retries += 1
+                    await asyncio.sleep(self._backoff_delay(attempt))
+        
+        try:
+            sop_data, finished = self._parse_response(response.text), True
+        except ValueError:
+            # Continuation requests are rare; run them off the event loop
+            sop_data, finished = await asyncio.to_thread(self._parse_or_continue, response.text, content_parts)
+        
+        if cache_key is not None and finished:
+            self.cache.put(cache_key, sop_data)
+        
+        return sop_data
+    
+    def analyze_video_frames_windowed(
+        self,
+        frames: List[Dict],
+        context: str = "",
+        audio_transcript: str = "",
+        window_size: int = 40,
+        overlap: int = 4,
+        max_workers: int = 4,
+        use_cache: bool = True
+    ) -> Dict:
+        """
+        Analyze long videos as overlapping frame windows in parallel
+        
+        Each window gets its own frames and the matching slice of the
+        transcript. The partial SOPs are then merged: steps are stitched in
+        time order, duplicates from the overlaps are removed, and steps are
+        renumbered into the usual title/description/safety_notes/steps schema.
+        
+        Args:
+            frames: List of Frame objects in timestamp order
+            context: Optional context about the task
+            audio_transcript: Optional timestamped audio transcript
+            window_size: Frames per window
+            overlap: Frames shared by neighbouring windows
+            max_workers: Maximum number of windows analyzed at once
+            use_cache: Set to False to bypass cached window responses
+            
+        Returns:
+            Dictionary containing the merged SOP structure
+        """
+        windows = _split_windows(frames, window_size, overlap)
+        if len(windows) <= 1:
+            return self.analyze_video_frames(frames, context, audio_transcript, use_cache)
+        
+        segments = _parse_transcript_segments(audio_transcript)
+        print(f"Analyzing {len(frames)} frames in {len(windows)} windows "
+              f"({max_workers} at a time)...")
+        
+        def analyze_window(index: int) -> Dict:
+            window = windows[index]
+            start, end = window[0]['timestamp'], window[-1]['timestamp']
+            
+            if segments:
+                transcript = _slice_transcript(segments, start, end)
+            else:
+                # Untimed transcripts cannot be sliced
+                transcript = audio_transcript
+            
+            window_context = (
+                f"{context or 'Manufacturing/assembly process'}\n"
+                f"These frames are part {index + 1} of {len(windows)} of a longer video "
+                f"({start:.1f}s to {end:.1f}s). Only describe the steps shown in this part."
+            )
+            return self.analyze_video_frames(window, window_context, transcript, use_cache)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(analyze_window, range(len(windows))))
+        
+        sop_data = _merge_sop_parts(parts, windows)
+        print(f"Merged {sum(len(p['steps']) for p in parts)} window steps into {len(sop_data['steps'])} steps")
+        
+        return sop_data
+    
+    def analyze_video_frames_two_pass(
+        self,
+        frames: List[Dict],
+        fetch_frames: Callable[[List[float]], List[bytes]],
+        context: str = "",
+        audio_transcript: str = "",
+        use_cache: bool = True,
+        video_duration: Optional[float] = None
+    ) -> Dict:
+        """
+        Coarse-to-fine analysis: segment on thumbnails, refine around steps
+        
+        Pass 1 sends every frame as a small thumbnail and only asks where
+        each step happens. Pass 2 fetches a few high-resolution frames around
+        each proposed step and runs the normal analysis on those alone, which
+        writes the instructions and confirms the timestamps.
+        
+        Args:
+            frames: Thumbnail-sized Frame objects covering the whole video
+            fetch_frames: Returns encoded high-resolution images for a list of
+                timestamps (e.g. VideoFrameExtractor.extract_frames_at_timestamps)
+            context: Optional context about the task
+            audio_transcript: Optional audio transcript from the video
+            use_cache: Set to False to skip the cache lookup
+            video_duration: Probed length of the video; refinement frames are
+                kept inside it (defaults to the last thumbnail's timestamp,
+                which deduplication can leave well before the end)
+            
+        Returns:
+            Dictionary containing SOP structure with title, description, and steps
+            (the high-resolution frames are kept in `last_refined_frames`)
+        """
+        self.last_passes = []
+        
+        # Pass 1: step boundaries from thumbnails
+        print(f"Pass 1: segmenting {len(frames)} thumbnails...")
+        start_time = time.time()
+        prompt = self._create_segmentation_prompt(frames, context, audio_transcript)
+        images = [frame_bytes(frame) for frame in frames]
+        segments = self._segment(prompt, images, use_cache)
+        self._record_pass("Segmentation", images, self.estimate_request(prompt, images), start_time)
+        print(f"✓ Pass 1 proposed {len(segments)} steps")
+        
+        if not segments:
+            print("⚠️  No steps proposed; falling back to single-pass analysis")
+            return self.analyze_video_frames(frames, context, audio_transcript, use_cache)
+        
+        # Pass 2: high-resolution frames around each proposed step
+        if video_duration:
+            end_of_video = video_duration
+        else:
+            end_of_video = max(frame['timestamp'] for frame in frames)
+        timestamps = sorted({
+            round(min(max(0.0, t), end_of_video), 2)
+            for segment in segments
+            for t in _window_timestamps(
+                segment['timestamp_seconds'],
+                self.REFINE_WINDOW_SECONDS,
+                self.REFINE_FRAMES_PER_STEP
+            )
+        })
+        
+        print(f"Pass 2: refining with {len(timestamps)} high-resolution frames...")
+        start_time = time.time()
+        refined = [
+            Frame(i + 1, timestamp, data)
+            for i, (timestamp, data) in enumerate(zip(timestamps, fetch_frames(timestamps)))
+        ]
+        
+        outline = "\n".join(
+            f"- {segment['timestamp_seconds']:.1f}s: {segment.get('summary', '')}"
+            for segment in segments
+        )
+        refine_context = (
+            f"{context or 'Manufacturing/assembly process'}\n"
+            f"A first look at the whole video proposed these steps:\n{outline}\n"
+            f"The frames below were taken around those moments. Confirm or correct each step "
+            f"and its timestamp, merging or splitting steps where the frames show it."
+        )
+        sop_data = self.analyze_video_frames(refined, refine_context, audio_transcript, use_cache)
+        self._record_pass("Refinement", [frame.data for frame in refined], self.last_estimate, start_time)
+        self.last_refined_frames = refined
+        
+        print_pass_breakdown(self.last_passes)
+        return sop_data
+    
+    def _segment(self, prompt: str, images: List[bytes], use_cache: bool) -> List[Dict]:
+        """Run the segmentation request and return the proposed steps"""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(images, prompt, self.model_name, self.generation_config)
+            cached = self.cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                return cached['steps']
+        
+        text = _strip_code_fences(self._generate(_build_content_parts(prompt, images)))
+        try:
+            steps = json.loads(text)['steps']
+            finished = True
+        except (ValueError, KeyError, TypeError):
+            # Keep whatever steps arrived intact
+            parser = StepStreamParser()
+            steps = parser.feed(text)
+            finished = parser.finished
+        steps = [step for step in steps if isinstance(step, dict) and 'timestamp_seconds' in step]
+        
+        if cache_key is not None and finished:
+            self.cache.put(cache_key, {"steps": steps})
+        return steps
+    
+    def _record_pass(self, name: str, images: List[bytes], estimate: Dict, start_time: float):
+        """Store tokens, pixels and latency of one analysis pass"""
+        pixels = 0
+        for data in images:
+            try:
+                width, height = jpeg_dimensions(data)
+                pixels += width * height
+            except ValueError:
+                pass
+        self.last_passes.append({
+            "name": name,
+            "frames": len(images),
+            "pixels": pixels,
+            "tokens": estimate['total_tokens'] if estimate else 0,
+            "seconds": time.time() - start_time
+        })
+    
+    def _create_segmentation_prompt(self, frames: List[Dict], context: str, audio_transcript: str) -> str:
+        """Prompt for the cheap first pass that only locates the steps"""
+        timestamp_info = _format_timestamp_ranges([frame['timestamp'] for frame in frames])
+        audio_section = f"\nAudio Transcript (with timestamps):\n{audio_transcript}\n" if audio_transcript else ""
+        
+        return f"""You are segmenting a video of a worker performing a task into the steps of a Standard Operating Procedure.
+
+Task Context: {context if context else "Manufacturing/assembly process"}
+
+You will receive {len(frames)} low-resolution frames in time order.
+
+Frame Timestamps:
+{timestamp_info}
+{audio_section}
+Identify each distinct action (including disassembly AND reassembly) and the moment it is most clearly visible.
+Do not write full instructions yet.
+
+Output ONLY valid JSON:
+{{"steps": [{{"timestamp_seconds": 12.5, "summary": "Few-word description of the action"}}]}}
+"""
+    
+    def _prepare_request(
+        self,
+        frames: List[Dict],
+        context: str,
+        audio_transcript: str,
+        use_cache: bool
+    ) -> Tuple[Optional[str], Optional[Dict], Optional[List]]:
+        """
+        Build the prompt and content parts for one request
+        
+        Returns:
+            (cache_key, cached_response, content_parts); content_parts is
+            None when a cached response was found
+        """
+        # Create the prompt
+        prompt = self._create_prompt(frames, context, audio_transcript)
+        
+        images = [frame_bytes(frame) for frame in frames]
+        
+        estimate = self.estimate_request(prompt, images)
+        if not self._fits_budget(estimate):
+            prompt, images, estimate = self._compact_request(frames, context, audio_transcript, estimate)
+        self.last_estimate = estimate
+        print(f"  Request: ~{estimate['text_tokens']:,} text + ~{estimate['image_tokens']:,} image tokens "
+              f"({estimate['images']} images, {estimate['total_bytes'] / 1024 ** 2:.1f} MB)")
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(images, prompt, self.model_name, self.generation_config)
+            if use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    print("✓ Using cached Gemini response")
+                    return cache_key, cached, None
+        
+        return cache_key, None, _build_content_parts(prompt, images)
+    
+    def _generate(self, content_parts: List) -> str:
+        """Send one request to the model and return the response text"""
+        tokens = self._estimate_tokens(content_parts)
+        for attempt in range(self.MAX_RETRIES + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(tokens)
+            try:
+                response = self.model.generate_content(
+                    content_parts,
+                    generation_config=self.generation_config
+                )
+                return response.text
+            except Exception as e:
+                if attempt == self.MAX_RETRIES or not _is_retryable(e):
+                    raise
+                self.retries += 1
+                time.sleep(self._backoff_delay(attempt))
+    
+    def estimate_request(self, prompt: str, images: List[bytes]) -> Dict:
+        """
+        Pre-flight size estimate of a request
+        
+        Args:
+            prompt: Prompt text
+            images: Encoded JPEG images
+        
+        Returns:
+            Dictionary with:
+            {
+                "text_tokens": int,
+                "image_tokens": int,
+                "total_tokens": int,
+                "total_bytes": int,
+                "images": int
+            }
+        """
+        # ~4 characters per token for English text
+        text_tokens = len(prompt) // 4
+        image_total = 0
+        for data in images:
+            try:
+                image_total += image_tokens(*jpeg_dimensions(data), self.image_tile_tokens)
+            except ValueError:
+                # Unreadable header; assume the smallest image cost
+                image_total += self.image_tile_tokens
+        
+        return {
+            "text_tokens": text_tokens,
+            "image_tokens": image_total,
+            "total_tokens": text_tokens + image_total,
+            "total_bytes": len(prompt.encode('utf-8')) + sum(len(data) for data in images),
+            "images": len(images)
+        }
+    
+    def _estimate_tokens(self, content_parts: List) -> int:
+        """Rough input token count of a request, for the tokens-per-minute limit"""
+        images = [part["data"] for part in content_parts if not isinstance(part, str)]
+        prompt = "".join(part for part in content_parts if isinstance(part, str))
+        return self.estimate_request(prompt, images)["total_tokens"]
+    
+    def _fits_budget(self, estimate: Dict) -> bool:
+        return (estimate["total_tokens"] <= self.max_request_tokens
+                and estimate["total_bytes"] <= self.max_request_bytes)
+    
+    def _compact_request(
+        self,
+        frames: List[Dict],
+        context: str,
+        audio_transcript: str,
+        estimate: Dict
+    ) -> Tuple[str, List[bytes], Dict]:
+        """
+        Shrink a request that is over budget, cheapest loss first
+        
+        1. List frame timestamps as ranges instead of one line per frame
+        2. Drop transcript segments far from every frame
+        3. Send an evenly spaced subset of the frames
+        
+        Returns:
+            (prompt, images, estimate) of the compacted request
+        """
+        print(f"⚠️  Request is ~{estimate['total_tokens']:,} tokens / "
+              f"{estimate['total_bytes'] / 1024 ** 2:.1f} MB, over the budget of "
+              f"{self.max_request_tokens:,} tokens / {self.max_request_bytes / 1024 ** 2:.0f} MB; compacting")
+        images = [frame_bytes(frame) for frame in frames]
+        
+        # 1. Timestamp ranges
+        prompt = self._create_prompt(frames, context, audio_transcript, compact_timestamps=True)
+        compacted = self.estimate_request(prompt, images)
+        print(f"  - Frame timestamps listed as ranges: "
+              f"{estimate['text_tokens'] - compacted['text_tokens']:,} tokens saved")
+        estimate = compacted
+        if self._fits_budget(estimate):
+            return prompt, images, estimate
+        
+        # 2. Transcript segments far from every frame
+        segments = _parse_transcript_segments(audio_transcript)
+        if segments:
+            timestamps = sorted(frame['timestamp'] for frame in frames)
+            kept = [segment for segment in segments
+                    if _near_any(segment, timestamps, self.TRANSCRIPT_MARGIN_SECONDS)]
+            if len(kept) < len(segments):
+                audio_transcript = "\n".join(line for _, _, line in kept)
+                prompt = self._create_prompt(frames, context, audio_transcript, compact_timestamps=True)
+                compacted = self.estimate_request(prompt, images)
+                print(f"  - Dropped {len(segments) - len(kept)} of {len(segments)} transcript segments more than "
+                      f"{self.TRANSCRIPT_MARGIN_SECONDS:.0f}s from any frame: "
+                      f"{estimate['text_tokens'] - compacted['text_tokens']:,} tokens saved")
+                estimate = compacted
+                if self._fits_budget(estimate):
+                    return prompt, images, estimate
+        
+        # 3. Fewer frames, evenly spread over the video
+        if frames:
+            tokens_per_frame = estimate['image_tokens'] / len(frames)
+            bytes_per_frame = sum(len(data) for data in images) / len(frames)
+            text_bytes = estimate['total_bytes'] - sum(len(data) for data in images)
+            keep = int(min(
+                (self.max_request_tokens - estimate['text_tokens']) / tokens_per_frame,
+                (self.max_request_bytes - text_bytes) / bytes_per_frame
+            ))
+            keep = max(1, min(keep, len(frames)))
+            all_frames, all_images = frames, images
+            while keep < len(frames):
+                indices = _even_indices(len(all_frames), keep)
+                frames = [all_frames[i] for i in indices]
+                images = [all_images[i] for i in indices]
+                prompt = self._create_prompt(frames, context, audio_transcript, compact_timestamps=True)
+                estimate = self.estimate_request(prompt, images)
+                # Unevenly spaced frames need more timestamp ranges, so the
+                # text can grow; keep trimming until the rebuilt request fits
+                if self._fits_budget(estimate) or keep == 1:
+                    break
+                keep = max(1, min(keep - 1, int(keep * min(
+                    self.max_request_tokens / estimate['total_tokens'],
+                    self.max_request_bytes / estimate['total_bytes']
+                ))))
+            if len(frames) < len(all_frames):
+                print(f"  - Downsampled frames from {len(all_frames)} to {len(frames)} "
+                      f"to fit the image budget")
+        
+        if not self._fits_budget(estimate):
+            print(f"⚠️  Request is still ~{estimate['total_tokens']:,} tokens after compaction; sending anyway")
+        return prompt, images, estimate
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff, so retrying workers spread out"""
+        return random.uniform(0, min(self.BACKOFF_MAX_SECONDS, self.BACKOFF_BASE_SECONDS * 2 ** attempt))
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    def _create_prompt(
+        self,
+        frames: List[Dict],
+        context: str,
+        audio_transcript: str = "",
+        compact_timestamps: bool = False
+    ) -> str:
         """Create the system prompt for Gemini"""
         
         # Create timestamp information
-        timestamps = [f"Frame {i+1} at {frame['timestamp']:.2f}s" 
-                     for i, frame in enumerate(frames)]
-        timestamp_info = "\n".join(timestamps)
+        if compact_timestamps:
+            timestamp_info = _format_timestamp_ranges([frame['timestamp'] for frame in frames])
+        else:
+            timestamps = [f"Frame {i+1} at {frame['timestamp']:.2f}s" 
+                         for i, frame in enumerate(frames)]
+            timestamp_info = "\n".join(timestamps)
         
         # Add audio transcript section if available
         audio_section = ""
@@ -165,19 +781,98 @@ Output ONLY valid JSON. Do not include any markdown formatting or code blocks.
         
         return prompt
     
+    def _parse_or_continue(
+        self,
+        response_text: str,
+        content_parts: List,
+        on_step: Optional[Callable[[Dict], None]] = None
+    ) -> Tuple[Dict, bool]:
+        """
+        Parse a response, recovering from truncated or malformed output
+        
+        Complete steps are salvaged from a broken response. If the steps
+        array was cut off (typically at max_output_tokens), a short
+        continuation request asks only for the remaining steps instead of
+        re-running the whole analysis.
+        
+        Args:
+            response_text: Raw response text
+            content_parts: The request that produced the response
+            on_step: Called with each step recovered by a continuation
+        
+        Returns:
+            (sop_data, finished): the SOP structure, and whether the steps
+            list was complete (False if every continuation was cut off too)
+        """
+        try:
+            return self._parse_response(response_text), True
+        except ValueError as e:
+            error = e
+        
+        sop_data, finished = salvage_response(_strip_code_fences(response_text))
+        if sop_data is None:
+            raise error
+        sop_data['steps'] = [step for step in map(_complete_step, sop_data['steps']) if step is not None]
+        print(f"⚠️  Response was {'malformed' if finished else 'cut off'}; "
+              f"salvaged {len(sop_data['steps'])} complete steps")
+        
+        attempts = 0
+        while not finished and attempts < self.MAX_CONTINUATIONS:
+            attempts += 1
+            self.continuations += 1
+            print(f"Requesting the remaining steps (continuation {attempts})...")
+            
+            steps = sop_data['steps']
+            text = self._generate(content_parts + [self._create_continuation_prompt(steps)])
+            try:
+                new_steps = json.loads(_strip_code_fences(text))["steps"]
+                finished = True
+            except (ValueError, KeyError, TypeError):
+                continuation, finished = salvage_response(_strip_code_fences(text))
+                new_steps = continuation['steps'] if continuation else []
+            
+            new_steps = _continuation_steps(new_steps, steps)
+            for step in new_steps:
+                if on_step is not None:
+                    on_step(step)
+            steps.extend(new_steps)
+            print(f"✓ Continuation added {len(new_steps)} steps")
+            
+            if not new_steps:
+                break
+        
+        if not finished:
+            print("⚠️  Procedure may be incomplete: the model never finished the steps list")
+        
+        if not sop_data['steps']:
+            raise error
+        
+        return sop_data, finished
+    
+    def _create_continuation_prompt(self, steps: List[Dict]) -> str:
+        """Follow-up instruction asking only for the steps after `steps`"""
+        if steps:
+            done = "\n".join(
+                f"{step['step_number']}. ({step['timestamp_seconds']}s) {step['instruction']}"
+                for step in steps
+            )
+            position = (f"after step {_last_step_number(steps)} "
+                        f"({steps[-1]['timestamp_seconds']}s). Steps already written:\n{done}")
+        else:
+            position = "before any step was complete."
+        
+        return f"""Your previous answer to this request was cut off {position}
+
+Continue the procedure from where it stopped. Output ONLY valid JSON of the form
+{{"steps": [ ... ]}} containing just the remaining steps, numbered from
+{_last_step_number(steps) + 1}, with the same fields as before. Keep it concise.
+"""
+    
     def _parse_response(self, response_text: str) -> Dict:
         """Parse the LLM response into structured JSON"""
         
         # Remove markdown code blocks if present
-        text = response_text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        
-        text = text.strip()
+        text = _strip_code_fences(response_text)
         
         try:
             data = json.loads(text)
@@ -198,4 +893,313 @@ Output ONLY valid JSON. Do not include any markdown formatting or code blocks.
         except json.JSONDecodeError as e:
             print(f"Failed to parse JSON response: {e}")
             print(f"Response text: {text[:500]}...")
-            raise ValueError("LLM did not return valid JSON")
\ No newline at end of file
+            raise ValueError("LLM did not return valid JSON")
+
+
+def _strip_code_fences(response_text: str) -> str:
+    """Remove a markdown code block around the response, if present"""
+    text = response_text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    
+    return text.strip()
+
+
+def _build_content_parts(prompt: str, images: List[bytes]) -> List:
+    """
+    Prompt followed by the frames as inline JPEG blobs
+    
+    The SDK sends blobs as-is, so frames are never decoded into PIL images
+    and re-encoded on the way out.
+    """
+    return [prompt] + [
+        {"mime_type": "image/jpeg", "data": data if isinstance(data, bytes) else bytes(data)}
+        for data in images
+    ]
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether an API error is a rate limit (429) or server error (5xx)"""
+    # google.api_core exceptions carry the HTTP status as `code`
+    code = getattr(error, 'code', None)
+    return isinstance(code, int) and (code == 429 or 500 <= code < 600)
+
+
+def _format_timestamp_ranges(timestamps: List[float]) -> str:
+    """
+    Describe frame timestamps compactly, one line per evenly spaced run
+    
+    e.g. "Frames 1-40: 0.00s to 78.00s, every 2.00s"
+    """
+    lines = []
+    start = 0
+    while start < len(timestamps):
+        end = start
+        if start + 1 < len(timestamps):
+            step = timestamps[start + 1] - timestamps[start]
+            while (end + 1 < len(timestamps)
+                   and abs(timestamps[end + 1] - timestamps[end] - step) < 0.01):
+                end += 1
+        if end - start >= 2:
+            lines.append(f"Frames {start + 1}-{end + 1}: {timestamps[start]:.2f}s to "
+                         f"{timestamps[end]:.2f}s, every {step:.2f}s")
+        else:
+            # Runs of two are shorter listed individually
+            end = start
+            lines.append(f"Frame {start + 1} at {timestamps[start]:.2f}s")
+        start = end + 1
+    return "\n".join(lines)
+
+
+def _near_any(segment: Tuple[float, float, str], timestamps: List[float], margin: float) -> bool:
+    """Whether a transcript segment lies within `margin` seconds of a sorted timestamp"""
+    seg_start, seg_end, _ = segment
+    i = bisect.bisect_left(timestamps, seg_start - margin)
+    return i < len(timestamps) and timestamps[i] <= seg_end + margin
+
+
+def _even_indices(count: int, keep: int) -> List[int]:
+    """`keep` evenly spaced indices into range(count), including both ends"""
+    if keep == 1:
+        return [0]
+    return sorted({round(i * (count - 1) / (keep - 1)) for i in range(keep)})
+
+
+def _window_timestamps(center: float, half_width: float, count: int) -> List[float]:
+    """`count` timestamps evenly spread over center ± half_width"""
+    if count <= 1:
+        return [center]
+    return [center - half_width + 2 * half_width * i / (count - 1) for i in range(count)]
+
+
+def print_pass_breakdown(passes: List[Dict]):
+    """Log tokens, pixels and latency of each analysis pass"""
+    print("Analysis passes:")
+    for analysis_pass in passes:
+        print(f"  {analysis_pass['name']:<13} {analysis_pass['frames']:4d} frames  "
+              f"{analysis_pass['pixels'] / 1e6:7.1f} MP  ~{analysis_pass['tokens']:,} tokens  "
+              f"{analysis_pass['seconds']:.1f}s")
+    print(f"  {'Total':<13} {sum(p['frames'] for p in passes):4d} frames  "
+          f"{sum(p['pixels'] for p in passes) / 1e6:7.1f} MP  "
+          f"~{sum(p['tokens'] for p in passes):,} tokens  {sum(p['seconds'] for p in passes):.1f}s")
+
+
+def _split_windows(frames: List, window_size: int, overlap: int) -> List[List]:
+    """Split frames into windows of `window_size` that share `overlap` frames"""
+    step = max(1, window_size - overlap)
+    windows = []
+    for start in range(0, len(frames), step):
+        windows.append(frames[start:start + window_size])
+        if start + window_size >= len(frames):
+            break
+    return windows
+
+
+# Transcript lines look like "[12.5s - 15.0s]: text"
+_TRANSCRIPT_LINE = re.compile(r'^\[(\d+(?:\.\d+)?)s - (\d+(?:\.\d+)?)s\]:')
+
+
+def _parse_transcript_segments(audio_transcript: str) -> List[Tuple[float, float, str]]:
+    """Parse a timestamped transcript into (start, end, line) tuples"""
+    segments = []
+    for line in audio_transcript.splitlines():
+        match = _TRANSCRIPT_LINE.match(line.strip())
+        if match:
+            segments.append((float(match.group(1)), float(match.group(2)), line.strip()))
+    return segments
+
+
+def _slice_transcript(segments: List[Tuple[float, float, str]], start: float, end: float) -> str:
+    """Transcript lines that overlap the [start, end] time range"""
+    return "\n".join(line for seg_start, seg_end, line in segments
+                     if seg_end >= start and seg_start <= end)
+
+
+def _merge_sop_parts(parts: List[Dict], windows: List[List]) -> Dict:
+    """
+    Merge per-window SOPs into one SOP
+    
+    Each overlap between two windows is split at its midpoint, and a window
+    keeps only the steps inside the time range it owns. A step that nearly
+    repeats the last step of the previous window is dropped, and everything
+    is renumbered.
+    """
+    bounds = []
+    for i, window in enumerate(windows):
+        start = float('-inf') if i == 0 else (windows[i - 1][-1]['timestamp'] + window[0]['timestamp']) / 2
+        end = float('inf') if i == len(windows) - 1 else (window[-1]['timestamp'] + windows[i + 1][0]['timestamp']) / 2
+        bounds.append((start, end))
+    
+    # (window index, step) pairs; only overlaps between windows produce duplicates
+    steps = []
+    for index, (part, (start, end)) in enumerate(zip(parts, bounds)):
+        steps.extend((index, step) for step in part.get('steps', [])
+                     if start <= step.get('timestamp_seconds', 0) < end)
+    steps.sort(key=lambda item: item[1].get('timestamp_seconds', 0))
+    
+    merged_steps = []
+    previous_index = None
+    for index, step in steps:
+        if (merged_steps and index != previous_index
+                and _is_duplicate_step(merged_steps[-1], step)):
+            continue
+        merged_steps.append(dict(step))
+        previous_index = index
+    
+    for number, step in enumerate(merged_steps, start=1):
+        step['step_number'] = number
+    
+    safety_notes = []
+    seen_notes = set()
+    for part in parts:
+        for note in part.get('safety_notes', []):
+            if note.strip().lower() not in seen_notes:
+                seen_notes.add(note.strip().lower())
+                safety_notes.append(note)
+    
+    # The first window sets the scene; its title describes the whole task best
+    first = parts[0]
+    return {
+        "title": first.get('title', 'Untitled Procedure'),
+        "description": first.get('description', ''),
+        "safety_notes": safety_notes,
+        "steps": merged_steps
+    }
+
+
+def _complete_step(step) -> Optional[Dict]:
+    """
+    Copy of a model-written step with a numeric timestamp
+    
+    Returns None for anything that is not a step with every required field,
+    a text instruction and a timestamp that reads as a number.
+    """
+    if not isinstance(step, dict) or not all(field in step for field in REQUIRED_STEP_FIELDS):
+        return None
+    if not isinstance(step['instruction'], str) or isinstance(step['timestamp_seconds'], bool):
+        return None
+    try:
+        return dict(step, timestamp_seconds=float(step['timestamp_seconds']))
+    except (TypeError, ValueError):
+        return None
+
+
+def _last_step_number(steps: List[Dict]) -> int:
+    """Number of the last step (its position if the model numbered it oddly)"""
+    if not steps:
+        return 0
+    try:
+        return int(steps[-1]['step_number'])
+    except (TypeError, ValueError):
+        return len(steps)
+
+
+def _continuation_steps(new_steps: List, steps: List[Dict]) -> List[Dict]:
+    """
+    Steps of a continuation response that extend `steps`
+    
+    The model's own numbering is not trusted: incomplete steps and repeats
+    of steps already written are dropped, and the rest are numbered on from
+    the last step.
+    """
+    kept = []
+    for step in map(_complete_step, new_steps):
+        if step is None or any(_is_duplicate_step(earlier, step) for earlier in steps + kept):
+            continue
+        kept.append(step)
+    
+    last_number = _last_step_number(steps)
+    for number, step in enumerate(kept, start=last_number + 1):
+        step['step_number'] = number
+    return kept
+
+
+def _is_duplicate_step(previous: Dict, step: Dict, max_gap_seconds: float = 10.0) -> bool:
+    """Whether two neighbouring steps describe the same action"""
+    if abs(step.get('timestamp_seconds', 0) - previous.get('timestamp_seconds', 0)) > max_gap_seconds:
+        return False
+    similarity = difflib.SequenceMatcher(
+        None,
+        previous['instruction'].lower(),
+        step['instruction'].lower()
+    ).ratio()
+    return similarity >= 0.8
+
+
+def benchmark_content_building(frame_count: int = 500, width: int = 512):
+    """
+    Compare CPU time and peak memory of handing frames to the SDK as PIL
+    images (the old path) versus inline JPEG blobs
+    
+    Both paths include the SDK's own conversion of the parts into a request
+    (for PIL images, a lossless WebP re-encode). Without the SDK installed
+    the PIL path falls back to simulating it with a JPEG re-encode.
+    
+    Args:
+        frame_count: Number of frames in the request
+        width: Width of the synthetic frames
+    """
+    import base64
+    import io
+    import tracemalloc
+    import cv2
+    import numpy as np
+    from PIL import Image
+    
+    rng = np.random.default_rng(0)
+    height = width * 9 // 16
+    # Smooth gradient plus noise compresses like real footage
+    gradient = np.linspace(0, 200, width, dtype=np.uint8)[np.newaxis, :, np.newaxis]
+    jpegs = []
+    for i in range(frame_count):
+        image = np.broadcast_to(gradient, (height, width, 3)) + rng.integers(0, 40, (height, width, 3), dtype=np.uint8)
+        jpegs.append(cv2.imencode('.jpg', image)[1].tobytes())
+    encoded = [base64.b64encode(data).decode('utf-8') for data in jpegs]
+    
+    try:
+        # What generate_content() does with the parts before sending them
+        from google.generativeai.types.content_types import to_content
+    except ImportError:
+        to_content = None
+    
+    def pil_path():
+        parts = ["prompt"]
+        for image_data in encoded:
+            image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+            if to_content is None:
+                # Simulate the SDK's re-encode of a PIL image
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG")
+                image = {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+            parts.append(image)
+        return to_content(parts) if to_content else parts
+    
+    def blob_path():
+        parts = _build_content_parts("prompt", jpegs)
+        return to_content(parts) if to_content else parts
+    
+    print(f"Content building for {frame_count} frames ({width}x{height}, "
+          f"{sum(map(len, jpegs)) / 1024 ** 2:.1f} MB of JPEG, "
+          f"{'SDK conversion' if to_content else 'simulated SDK re-encode'}):")
+    
+    for label, build in (("PIL images", pil_path), ("Inline blobs", blob_path)):
+        tracemalloc.start()
+        start = time.process_time()
+        parts = build()
+        cpu_seconds = time.process_time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del parts
+        print(f"  {label:<13} CPU {cpu_seconds * 1000:8.1f} ms   peak memory {peak / 1024 ** 2:7.1f} MB")
+
+
+if __name__ == "__main__":
+    import sys
+    
+    if "--benchmark" in sys.argv:
+        benchmark_content_building()
+        sys.exit(0)
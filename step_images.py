@@ -0,0 +1,160 @@
+"""
+Step Image Selection Module
+Picks the image shown for each SOP step: an O(log n) timestamp index plus a
+local re-ranker that prefers sharp frames that differ from the previous step
+"""
+
+import bisect
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from frame import frame_bytes, jpeg_dimensions
+from frame_quality import decode_gray_to_width, gray_sharpness
+
+
+class StepImageSelector:
+    """
+    Chooses step images from a fixed set of frames
+    
+    Frames within ±`window_seconds` of the model's timestamp are scored on
+    sharpness, on how much they differ from the previous step's image, and
+    on closeness to the requested time. Features are computed once per frame
+    and reused across steps. Every frame is decoded at the same width first,
+    so thumbnails and full-resolution frames (as in two-pass mode) are
+    compared fairly.
+    """
+    
+    # Score weights: sharpness, difference from the previous image, closeness
+    WEIGHTS = (0.5, 0.3, 0.2)
+    
+    # Side length of the grayscale thumbnails compared between steps
+    THUMBNAIL_SIZE = 32
+    
+    # Common width frames are scored at (narrower if a frame is smaller)
+    SCORE_WIDTH = 128
+    
+    def __init__(
+        self,
+        frames: List[Dict],
+        timestamp_map: Dict[float, float] = None,
+        window_seconds: float = 2.0,
+        rerank: bool = True
+    ):
+        """
+        Build the timestamp index
+        
+        Args:
+            frames: Frame objects (or frame dictionaries) available for the PDF
+            timestamp_map: Timestamps of deduplicated frames mapped to the
+                timestamp of the frame that was kept
+            window_seconds: How far from the model's timestamp to look
+            rerank: Set to False to always take the nearest frame (e.g. when
+                every step already has its own exact frame)
+        """
+        self.window_seconds = window_seconds
+        self.rerank = rerank
+        
+        frame_lookup = {frame['timestamp']: frame for frame in frames}
+        self._timestamps = sorted(frame_lookup)
+        self._frames = [frame_lookup[t] for t in self._timestamps]
+        
+        # Dropped timestamps still resolve to their surviving frame
+        self._timestamp_map = dict(timestamp_map or {})
+        self._all_timestamps = sorted(set(self._timestamps) | set(self._timestamp_map))
+        
+        self._sharpness: Dict[int, float] = {}
+        self._thumbnails: Dict[int, np.ndarray] = {}
+        self._previous: Optional[int] = None
+        self._score_width: Optional[int] = None
+    
+    def select(self, timestamp: float) -> Optional[Dict]:
+        """
+        Pick the image for the next step
+        
+        Args:
+            timestamp: Timestamp the model chose for the step
+        
+        Returns:
+            The chosen frame, or None if there are no frames
+        """
+        if not self._timestamps:
+            return None
+        
+        closest = _nearest(self._all_timestamps, timestamp)
+        nearest = self._index_of(self._timestamp_map.get(closest, closest))
+        
+        candidates = [nearest]
+        if self.rerank:
+            low = bisect.bisect_left(self._timestamps, timestamp - self.window_seconds)
+            high = bisect.bisect_right(self._timestamps, timestamp + self.window_seconds)
+            candidates = sorted(set(range(low, high)) | {nearest})
+        
+        choice = candidates[0] if len(candidates) == 1 else self._best(candidates, timestamp)
+        self._previous = choice
+        return self._frames[choice]
+    
+    def _best(self, candidates: List[int], timestamp: float) -> int:
+        """Highest-scoring candidate index"""
+        self._compute_features(candidates)
+        
+        sharpness = np.array([self._sharpness[i] for i in candidates])
+        sharpness = sharpness / sharpness.max() if sharpness.max() > 0 else np.zeros(len(candidates))
+        
+        if self._previous is not None:
+            self._compute_features([self._previous])
+            stack = np.stack([self._thumbnails[i] for i in candidates])
+            difference = np.abs(stack - self._thumbnails[self._previous]).mean(axis=(1, 2))
+            difference = difference / difference.max() if difference.max() > 0 else np.zeros(len(candidates))
+        else:
+            difference = np.ones(len(candidates))
+        
+        distance = np.abs(np.array([self._timestamps[i] for i in candidates]) - timestamp)
+        closeness = 1 - np.minimum(distance / max(self.window_seconds, 1e-6), 1)
+        
+        sharp_weight, difference_weight, closeness_weight = self.WEIGHTS
+        scores = sharp_weight * sharpness + difference_weight * difference + closeness_weight * closeness
+        return candidates[int(np.argmax(scores))]
+    
+    def _compute_features(self, indices: List[int]):
+        """Sharpness and comparison thumbnail for frames not scored yet"""
+        missing = [i for i in indices if i not in self._sharpness]
+        if not missing:
+            return
+        
+        if self._score_width is None:
+            # Never upscale: the smallest frame sets the common width
+            self._score_width = min(
+                [self.SCORE_WIDTH] + [jpeg_dimensions(frame_bytes(frame))[0] for frame in self._frames]
+            )
+        
+        images = [bytes(frame_bytes(self._frames[i])) for i in missing]
+        grays = decode_gray_to_width(images, self._score_width)
+        for i, score in zip(missing, gray_sharpness(grays)):
+            self._sharpness[i] = float(score)
+        for i, gray in zip(missing, grays):
+            self._thumbnails[i] = cv2.resize(
+                gray,
+                (self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE),
+                interpolation=cv2.INTER_AREA
+            ).astype(np.float32)
+    
+    def _index_of(self, timestamp: float) -> int:
+        """Position of a kept frame's timestamp in the index"""
+        i = bisect.bisect_left(self._timestamps, timestamp)
+        if i < len(self._timestamps) and self._timestamps[i] == timestamp:
+            return i
+        # Map target not among the frames; fall back to the nearest kept frame
+        return bisect.bisect_left(self._timestamps, _nearest(self._timestamps, timestamp))
+
+
+def _nearest(timestamps: List[float], timestamp: float) -> float:
+    """Closest value in a sorted, non-empty list"""
+    i = bisect.bisect_left(timestamps, timestamp)
+    if i == 0:
+        return timestamps[0]
+    if i == len(timestamps):
+        return timestamps[-1]
+    before, after = timestamps[i - 1], timestamps[i]
+    return before if timestamp - before <= after - timestamp else after
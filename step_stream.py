@@ -0,0 +1,159 @@
+"""
+Step Stream Module
+Incremental parser that pulls completed SOP steps out of a partially
+received JSON response, and salvage of truncated or malformed responses
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+REQUIRED_STEP_FIELDS = ("step_number", "instruction", "timestamp_seconds")
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class StepStreamParser:
+    """
+    Emits each entry of the response's "steps" array as soon as it closes
+    
+    Text is fed in chunks as it arrives from the model. Each character is
+    scanned once, tracking strings and bracket depth, so a step is parsed
+    the moment its closing brace arrives, long before the whole response
+    is valid JSON.
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._in_steps = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._step_start = None
+    
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Add a chunk of response text
+        
+        Returns:
+            Steps completed by this chunk (usually zero or one)
+        """
+        self.text += chunk
+        steps = []
+        
+        while not self._in_steps and not self._done:
+            key = self.text.find('"steps"', self._pos)
+            if key == -1:
+                # Keep scanning from just before the end, in case the key is split
+                self._pos = max(self._pos, len(self.text) - len('"steps"'))
+                return steps
+            after = self.text[key + len('"steps"'):].lstrip()
+            if not after or (after[0] == ':' and '[' not in after):
+                # Wait for the rest of the key/value separator
+                self._pos = key
+                return steps
+            if after[0] != ':':
+                # The word appeared as a string value, not as the key
+                self._pos = key + 1
+                continue
+            self._in_steps = True
+            self._pos = self.text.index('[', key) + 1
+        
+        while self._in_steps and self._pos < len(self.text):
+            char = self.text[self._pos]
+            
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._step_start = self._pos
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0 and self._step_start is not None:
+                    step = self._parse_step(self.text[self._step_start:self._pos + 1])
+                    if step is not None:
+                        steps.append(step)
+                    self._step_start = None
+            elif char == ']' and self._depth == 0:
+                # End of the steps array
+                self._in_steps = False
+                self._done = True
+            
+            self._pos += 1
+        
+        return steps
+    
+    @property
+    def finished(self) -> bool:
+        """Whether the closing bracket of the steps array has been seen"""
+        return self._done
+    
+    @staticmethod
+    def _parse_step(text: str):
+        """Parse one step object (None if the model produced invalid JSON)"""
+        try:
+            step = json.loads(text)
+        except ValueError:
+            # Models often leave a trailing comma before the closing brace
+            try:
+                step = json.loads(_TRAILING_COMMA.sub(r'\1', text))
+            except ValueError:
+                return None
+        return step if isinstance(step, dict) else None
+
+
+def salvage_response(text: str) -> Tuple[Optional[Dict], bool]:
+    """
+    Recover what is usable from a truncated or malformed SOP response
+    
+    Every step object that closed properly is kept; a step cut off halfway
+    is dropped. Title, description and safety notes are kept when their
+    values are intact.
+    
+    Args:
+        text: Raw response text
+    
+    Returns:
+        (sop_data, finished): sop_data is None if nothing could be
+        recovered; finished is False when the steps array was cut off
+    """
+    parser = StepStreamParser()
+    steps = [
+        step for step in parser.feed(text)
+        if all(field in step for field in REQUIRED_STEP_FIELDS)
+    ]
+    title = _value_after(text, "title")
+    
+    if not steps and title is None:
+        return None, False
+    
+    safety_notes = _value_after(text, "safety_notes")
+    return {
+        "title": title if isinstance(title, str) else "Untitled Procedure",
+        "description": _value_after(text, "description") or "",
+        "safety_notes": safety_notes if isinstance(safety_notes, list) else [],
+        "steps": steps
+    }, parser.finished
+
+
+def _value_after(text: str, key: str):
+    """Decode the JSON value of the first `"key":` in text (None if cut off or absent)"""
+    match = re.search(rf'"{key}"\s*:\s*', text)
+    if not match:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, match.end())
+    except ValueError:
+        return None
+    return value
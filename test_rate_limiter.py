@@ -0,0 +1,175 @@
+"""
+Rate Limiter Test Script
+Fires a burst of concurrent analyses at a local stand-in for the Gemini API,
+with and without the token-bucket limiter, and reports throughput
+"""
+
+import asyncio
+import sys
+import threading
+import time
+
+from rate_limiter import RateLimiter
+
+
+class StandInModel:
+    """
+    Local stand-in for the Gemini API used to measure throughput offline
+    
+    Answers after a fixed latency with canned SOP JSON, and rejects requests
+    above its own rate limit with a 429, like the real API. The limit is
+    enforced over a sliding window of `window_seconds`.
+    """
+    
+    def __init__(self, requests_per_minute: float, latency_seconds: float = 0.5, window_seconds: float = 60):
+        self.window_limit = max(1, int(requests_per_minute * window_seconds / 60))
+        self.window_seconds = window_seconds
+        self.latency_seconds = latency_seconds
+        self.accepted = 0
+        self.rejected = 0
+        self._window = []
+        self._lock = threading.Lock()
+    
+    def _admit(self):
+        with self._lock:
+            now = time.time()
+            self._window = [t for t in self._window if now - t < self.window_seconds]
+            if len(self._window) >= self.window_limit:
+                self.rejected += 1
+                raise StandInError(429, "Resource has been exhausted")
+            self._window.append(now)
+            self.accepted += 1
+    
+    def _response(self):
+        class Response:
+            text = (
+                '{"title": "Stand-in", "description": "", "safety_notes": [], '
+                '"steps": [{"step_number": 1, "timestamp_seconds": 0, '
+                '"instruction": "Do the task", "frame_reference": 1}]}'
+            )
+        return Response()
+    
+    def generate_content(self, content_parts, generation_config=None):
+        self._admit()
+        time.sleep(self.latency_seconds)
+        return self._response()
+    
+    async def generate_content_async(self, content_parts, generation_config=None):
+        self._admit()
+        await asyncio.sleep(self.latency_seconds)
+        return self._response()
+
+
+class StandInError(Exception):
+    """HTTP-style error raised by StandInModel"""
+    
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def test_token_bucket():
+    """A full bucket admits its capacity at once, then asks the caller to wait"""
+    print("🪣 Testing token bucket...\n")
+    
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=10 ** 9, burst_seconds=5)
+    admitted = sum(1 for _ in range(10) if limiter.try_acquire() == 0)
+    wait = limiter.try_acquire()
+    
+    print(f"   Admitted {admitted} of 10 requests, next wait {wait:.2f}s")
+    if admitted != 5 or not 0 < wait <= 1:
+        print("❌ Bucket did not hold 5 seconds of quota at 1 request/s\n")
+        return False
+    
+    print("✅ Token bucket OK\n")
+    return True
+
+
+def test_burst(
+    jobs: int = 60,
+    requests_per_minute: float = 600,
+    latency_seconds: float = 0.5,
+    window_seconds: float = 1.0
+):
+    """
+    Fire a burst of concurrent analyses at a StandInModel, with and without
+    a RateLimiter matching the model's limit, and report throughput
+    
+    The stand-in enforces its limit over a short window so the burst
+    finishes in seconds instead of minutes.
+    
+    Args:
+        jobs: Concurrent analysis requests in the burst
+        requests_per_minute: Rate limit enforced by the stand-in
+        latency_seconds: Simulated response time of the stand-in
+        window_seconds: Window over which the stand-in enforces its limit
+    """
+    import cv2
+    import numpy as np
+    from frame import Frame
+    from sop_analyzer import SOPAnalyzer
+    
+    print(f"⚡ Burst of {jobs} jobs against a stand-in limited to {requests_per_minute:.0f} RPM "
+          f"({latency_seconds}s latency)\n")
+    
+    rng = np.random.default_rng(0)
+    frames = [
+        Frame(i, float(i), cv2.imencode('.jpg', rng.integers(0, 255, (216, 384, 3), dtype=np.uint8))[1].tobytes())
+        for i in range(10)
+    ]
+    
+    rejected = {}
+    completed = {}
+    for label, limiter in (
+        ("No limiter", None),
+        ("Token bucket", RateLimiter(requests_per_minute, 10 ** 9, burst_seconds=window_seconds))
+    ):
+        model = StandInModel(requests_per_minute, latency_seconds, window_seconds)
+        analyzer = SOPAnalyzer(model=model, rate_limiter=limiter, max_concurrent=jobs)
+        
+        async def burst():
+            return await asyncio.gather(
+                *(analyzer.analyze_video_frames_async(frames, f"job {i}") for i in range(jobs)),
+                return_exceptions=True
+            )
+        
+        start = time.time()
+        results = asyncio.run(burst())
+        elapsed = time.time() - start
+        completed[label] = sum(1 for result in results if not isinstance(result, Exception))
+        rejected[label] = model.rejected
+        
+        print(f"   {label:<13} {completed[label]}/{jobs} completed in {elapsed:.1f}s "
+              f"({completed[label] / elapsed * 60:.1f} jobs/min), "
+              f"{model.rejected} rate-limit errors, {analyzer.retries} retries")
+    
+    print()
+    if completed["Token bucket"] != jobs or rejected["Token bucket"] >= rejected["No limiter"]:
+        print("❌ The limiter did not reduce rate-limit errors\n")
+        return False
+    
+    print("✅ Burst OK\n")
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("  Rate Limiter Test")
+    print("=" * 60)
+    print()
+    
+    results = [test_token_bucket(), test_burst()]
+    
+    print("=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("⚠️  Some tests failed, check the messages above")
+    print("=" * 60)
+    
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Step Stream Test Script
+Feeds a canned SOP response through StepStreamParser, the streaming
+analyzer and the windowed analyzer with stub models, split into chunks at
+awkward points, and checks the steps that come out
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from frame import Frame
+from sop_analyzer import SOPAnalyzer
+from step_stream import StepStreamParser
+
+
+# Strings full of JSON syntax, so a split inside them looks like structure
+CANNED_SOP = {
+    "title": "steps",
+    "description": "Replace the {filter} [cartridge]; see \"steps\": below",
+    "safety_notes": ["Wear gloves }]", "Back-slash \\ and quote \" inside"],
+    "steps": [
+        {"step_number": 1, "instruction": "Open the lid {carefully}", "timestamp_seconds": 1.0,
+         "reasoning": "The latch is \"stiff\" ]"},
+        {"step_number": 2, "instruction": "Remove the filter", "timestamp_seconds": 3.5,
+         "reasoning": "Note the arrow {\"up\": true}", "tools": ["hands", {"optional": "pliers"}]},
+        {"step_number": 3, "instruction": "Seat the new filter \u2192 click", "timestamp_seconds": 5.0,
+         "reasoning": "Path C:\\filters\\new"},
+        {"step_number": 4, "instruction": "Close the lid", "timestamp_seconds": 99.0,
+         "reasoning": "Chosen past the end of the video on purpose"}
+    ]
+}
+CANNED_TEXT = "```json\n" + json.dumps(CANNED_SOP, indent=2, ensure_ascii=False) + "\n```"
+
+# Minimal JPEG header (SOI + SOF0 for 64x64); the stubs never decode it
+FRAME_DATA = bytes.fromhex("ffd8ffc0000b08004000400301110000ffd9")
+
+
+class StubStreamingModel:
+    """
+    Streams a canned response in the given chunks, like generate_content(stream=True)
+    
+    The time each chunk is handed out is recorded, so tests can check
+    what happened before the stream ended.
+    """
+    
+    def __init__(self, text: str, chunk_sizes, delay_seconds: float = 0):
+        self.chunks = []
+        position = 0
+        for size in chunk_sizes:
+            if position >= len(text):
+                break
+            self.chunks.append(text[position:position + size])
+            position += size
+        if position < len(text):
+            self.chunks.append(text[position:])
+        self.delay_seconds = delay_seconds
+        self.chunk_times = []
+    
+    def generate_content(self, content_parts, generation_config=None, stream=False):
+        class Chunk:
+            def __init__(self, text):
+                self.text = text
+        
+        def chunks():
+            for chunk in self.chunks:
+                time.sleep(self.delay_seconds)
+                self.chunk_times.append(time.time())
+                yield Chunk(chunk)
+        
+        if stream:
+            return chunks()
+        return Chunk("".join(self.chunks))
+
+
+# One distinct action per 10s of the windowed test video
+ACTIONS = [
+    "Unplug the unit", "Open the lid", "Remove the filter", "Clean the housing",
+    "Inspect the gasket", "Seat the new filter", "Close the lid", "Tighten the screws",
+    "Plug the unit in", "Switch it on", "Check the airflow", "Log the service"
+]
+
+
+class StubWindowModel:
+    """Answers each window request with canned steps at that window's frame times"""
+    
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+    
+    def generate_content(self, content_parts, generation_config=None, stream=False):
+        with self._lock:
+            self.requests += 1
+        prompt = content_parts[0]
+        times = [float(t) for t in re.findall(r'at (\d+\.\d+)s', prompt)]
+        
+        class Response:
+            text = json.dumps({
+                "title": "Windowed task",
+                "description": "",
+                "safety_notes": ["Wear gloves"],
+                "steps": [
+                    {"step_number": i + 1, "instruction": ACTIONS[int(t) // 10], "timestamp_seconds": t}
+                    # One step per 10s of video; overlapping windows both report it
+                    for i, t in enumerate(t for t in times if t % 10 == 0)
+                ]
+            })
+        return Response()
+
+
+def chunkings(text: str):
+    """(label, chunk sizes) splits of `text`, including one at every position"""
+    rng = random.Random(0)
+    yield "whole", [len(text)]
+    yield "1 char", [1] * len(text)
+    yield "7 chars", [7] * (len(text) // 7 + 1)
+    for seed in range(20):
+        yield f"random {seed}", [rng.randint(1, 40) for _ in range(len(text))]
+    for position in range(1, len(text)):
+        yield f"split at {position}", [position]
+
+
+def check(checks) -> bool:
+    """Print failed checks; True if all passed"""
+    failures = [message for ok, message in checks if not ok]
+    for message in failures:
+        print(f"❌ {message}")
+    if failures:
+        print()
+    return not failures
+
+
+def test_parser_chunking():
+    """Every way of splitting the response yields the same steps"""
+    print("🧩 Testing StepStreamParser with awkward chunk boundaries...\n")
+    
+    failures = []
+    runs = 0
+    for label, sizes in chunkings(CANNED_TEXT):
+        model = StubStreamingModel(CANNED_TEXT, sizes)
+        parser = StepStreamParser()
+        steps = [step for chunk in model.chunks for step in parser.feed(chunk)]
+        runs += 1
+        if steps != CANNED_SOP['steps'] or not parser.finished:
+            failures.append(label)
+    
+    print(f"   {runs - len(failures)}/{runs} splits produced the 4 canned steps\n")
+    if not check([(not failures, f"wrong steps for splits: {', '.join(failures[:5])}")]):
+        return False
+    
+    print("✅ Parser chunking OK\n")
+    return True
+
+
+def test_parser_incremental():
+    """Each step is emitted by the chunk that closes it, not at the end of the response"""
+    print("⏱️  Testing that steps are emitted as soon as they close...\n")
+    
+    text = CANNED_TEXT
+    steps_end = text.rindex(']')
+    parser = StepStreamParser()
+    emitted_at = []
+    for position, char in enumerate(text):
+        for step in parser.feed(char):
+            emitted_at.append(position)
+    
+    print(f"   Steps emitted at characters {emitted_at} (steps array ends at {steps_end})\n")
+    if not check([
+        (len(emitted_at) == len(CANNED_SOP['steps']), "not every step was emitted"),
+        (all(text[position] == '}' for position in emitted_at), "steps were not emitted at their closing brace"),
+        (all(position < steps_end for position in emitted_at), "steps waited for the end of the array"),
+    ]):
+        return False
+    
+    print("✅ Incremental parsing OK\n")
+    return True
+
+
+def test_streaming_analyzer():
+    """analyze_video_frames_streaming hands each step to on_step while the response streams"""
+    print("📡 Testing streaming analysis with a stub model...\n")
+    
+    model = StubStreamingModel(CANNED_TEXT, [13] * len(CANNED_TEXT), delay_seconds=0.002)
+    analyzer = SOPAnalyzer(model=model)
+    received = []
+    sop_data = analyzer.analyze_video_frames_streaming(
+        [Frame(1, 0.0, FRAME_DATA)],
+        on_step=lambda step: received.append((step, time.time()))
+    )
+    stream_end = model.chunk_times[-1]
+    timings = analyzer.last_timings
+    
+    print(f"\n   {len(received)} steps via on_step, first after {timings['first_step']:.3f}s "
+          f"of {timings['total']:.3f}s\n")
+    if not check([
+        ([step for step, _ in received] == CANNED_SOP['steps'], "on_step did not receive every step in order"),
+        (sop_data['steps'] == CANNED_SOP['steps'] and sop_data['title'] == "steps",
+         "the returned SOP differs from the canned response"),
+        (received and received[-1][1] < stream_end, "steps were only handed out after the stream ended"),
+        (timings['first_step'] is not None and timings['first_step'] < timings['total'],
+         "time to first step was not recorded separately"),
+    ]):
+        return False
+    
+    print("✅ Streaming analysis OK\n")
+    return True
+
+
+def test_windowed_analyzer():
+    """Windowed analysis merges overlapping windows into one renumbered step list"""
+    print("🪟 Testing windowed analysis with a stub model...\n")
+    
+    frames = [Frame(i + 1, float(i * 2), FRAME_DATA) for i in range(60)]
+    model = StubWindowModel()
+    analyzer = SOPAnalyzer(model=model)
+    sop_data = analyzer.analyze_video_frames_windowed(frames, window_size=20, overlap=4, max_workers=3)
+    
+    times = [step['timestamp_seconds'] for step in sop_data['steps']]
+    expected = [float(t) for t in range(0, 120, 10)]
+    print(f"\n   {model.requests} window requests, {len(times)} merged steps at {times}\n")
+    if not check([
+        (model.requests > 1, "frames were not split into windows"),
+        (times == expected, "overlapping windows were not de-duplicated into one step per 10s"),
+        ([step['step_number'] for step in sop_data['steps']] == list(range(1, len(expected) + 1)),
+         "merged steps were not renumbered"),
+        (sop_data['safety_notes'] == ["Wear gloves"], "safety notes were not de-duplicated"),
+    ]):
+        return False
+    
+    print("✅ Windowed analysis OK\n")
+    return True
+
+
+def test_step_image_prefetch():
+    """In streaming mode, step images are fetched while the model is still writing"""
+    print("🖼️  Testing step image prefetch during streaming...\n")
+    
+    try:
+        from main import VideoToSOPGenerator
+        from video_processor import make_synthetic_video
+        
+        work_dir = tempfile.mkdtemp(prefix="sop_stream_")
+        video_path = make_synthetic_video(os.path.join(work_dir, "video.mp4"), 8, "640x360", 10)
+    except Exception as e:
+        print(f"❌ Could not create a test video (is FFmpeg installed?): {e}\n")
+        return False
+    
+    model = StubStreamingModel(CANNED_TEXT, [13] * len(CANNED_TEXT), delay_seconds=0.01)
+    generator = VideoToSOPGenerator(
+        interval_seconds=1,
+        hires_step_images=True,
+        frame_cache_dir=None,
+        llm_cache_dir=None,
+        stream=True,
+        backend=model
+    )
+    
+    calls = []
+    extract = generator.video_processor.extract_frames_at_timestamps
+    
+    def recording_extract(video, timestamps, resize_width=None):
+        calls.append((time.time(), list(timestamps)))
+        return extract(video, timestamps, resize_width=resize_width)
+    
+    generator.video_processor.extract_frames_at_timestamps = recording_extract
+    sop_data = generator.generate_sop(video_path, os.path.join(work_dir, "sop.pdf"))
+    stream_end = model.chunk_times[-1]
+    
+    print(f"\n   {len(calls)} step image extractions, "
+          f"{sum(1 for started, _ in calls if started < stream_end)} started before the stream ended\n")
+    if not check([
+        (len(sop_data['steps']) == len(CANNED_SOP['steps']), "steps were lost"),
+        (len(calls) == len(CANNED_SOP['steps']) and all(len(timestamps) == 1 for _, timestamps in calls),
+         "prefetched images were extracted again after the analysis"),
+        (calls and calls[0][0] < stream_end, "no step image was fetched before the stream ended"),
+        (all(timestamps[0] < 8 for _, timestamps in calls), "a timestamp past the end was not clamped"),
+        (os.path.exists(os.path.join(work_dir, "sop.pdf")), "no PDF was written"),
+    ]):
+        return False
+    
+    print("✅ Step image prefetch OK\n")
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("  Step Stream Test (stub models)")
+    print("=" * 60)
+    print()
+    
+    results = [
+        test_parser_chunking(),
+        test_parser_incremental(),
+        test_streaming_analyzer(),
+        test_windowed_analyzer(),
+        test_step_image_prefetch()
+    ]
+    
+    print("=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("⚠️  Some tests failed, check the messages above")
+    print("=" * 60)
+    
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Chunked Transcription Test Script
+Runs silence-split parallel transcription against a local stand-in for
+Groq's transcription endpoint and checks the stitched timestamps
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+from whisper_transcription import (
+    FAILED_CHUNK_TEXT, MAX_UPLOAD_BYTES, SAMPLE_RATE, VAD_FRAME_SECONDS,
+    encode_wav, find_silences, transcribe_pcm, transcribe_with_whisper_groq, voice_activity
+)
+
+
+class StandInTranscriptionServer:
+    """
+    Local stand-in for Groq's transcription endpoint
+    
+    Pass `url` as the client's base_url (or set GROQ_BASE_URL). Each uploaded
+    WAV is answered with one "speech" segment per voiced stretch (found with
+    the same VAD), after a latency that grows with the audio length like the
+    real service. Uploads over MAX_UPLOAD_BYTES are rejected with a 413.
+    
+    Failures can be injected: the first `fail_first` requests, and every
+    upload shorter than `fail_under_seconds`, are answered with a 400.
+    """
+    
+    def __init__(
+        self,
+        latency_seconds: float = 0.2,
+        seconds_per_audio_second: float = 0.005,
+        fail_first: int = 0,
+        fail_under_seconds: float = 0
+    ):
+        self.latency_seconds = latency_seconds
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.fail_first = fail_first
+        self.fail_under_seconds = fail_under_seconds
+        self.requests = 0
+        self.peak_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def __enter__(self) -> "StandInTranscriptionServer":
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        stand_in = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if not self.path.endswith("/audio/transcriptions"):
+                    self._reply(404, {"error": {"message": "Not found"}})
+                elif len(body) > MAX_UPLOAD_BYTES:
+                    self._reply(413, {"error": {"message": "Request Entity Too Large"}})
+                else:
+                    result = stand_in._transcribe(self.headers["Content-Type"], body)
+                    if result is None:
+                        self._reply(400, {"error": {"message": "Injected failure"}})
+                    else:
+                        self._reply(200, result)
+            
+            def _reply(self, status: int, payload: dict):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def _transcribe(self, content_type: str, body: bytes):
+        """verbose_json response for one upload (None for an injected failure)"""
+        from email.parser import BytesParser
+        from email.policy import HTTP
+        
+        with self._lock:
+            self.requests += 1
+            request_number = self.requests
+            self._active += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._active)
+        
+        try:
+            form = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + body
+            )
+            upload = next(part for part in form.iter_parts() if part.get_filename())
+            with wave.open(io.BytesIO(upload.get_payload(decode=True)), 'rb') as wav:
+                sample_rate = wav.getframerate()
+                samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            
+            duration = len(samples) / sample_rate
+            time.sleep(self.latency_seconds + duration * self.seconds_per_audio_second)
+            if request_number <= self.fail_first or duration < self.fail_under_seconds:
+                return None
+            
+            # Voiced stretches are the gaps between silences (ignoring the
+            # partial VAD frame at the end of the upload)
+            silences = find_silences(voice_activity(samples, sample_rate), sample_rate)
+            bounds = [0] + [sample for silence in silences for sample in silence] + [len(samples)]
+            min_length = int(sample_rate * VAD_FRAME_SECONDS)
+            voiced = [(start, end) for start, end in zip(bounds[::2], bounds[1::2]) if end - start > min_length]
+            segments = [
+                {"id": i, "start": start / sample_rate, "end": end / sample_rate, "text": " speech"}
+                for i, (start, end) in enumerate(voiced)
+            ]
+            return {
+                "text": " ".join(segment["text"].strip() for segment in segments),
+                "duration": duration,
+                "segments": segments
+            }
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+def synthetic_speech(minutes: float, seed: int = 0):
+    """
+    Bursts of loud noise ("speech") separated by 0.5-1.5s pauses over quiet hiss
+    
+    Returns:
+        (samples, burst start times in seconds)
+    """
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * SAMPLE_RATE)
+    samples = rng.normal(0, 20, total).astype(np.int16)
+    speech_starts = []
+    position = 0.0
+    while True:
+        length = rng.uniform(2, 6)
+        if (position + length) * SAMPLE_RATE >= total:
+            break
+        start = int(position * SAMPLE_RATE)
+        end = int((position + length) * SAMPLE_RATE)
+        samples[start:end] = rng.normal(0, 3000, end - start).clip(-32768, 32767).astype(np.int16)
+        speech_starts.append(position)
+        position += length + rng.uniform(0.5, 1.5)
+    return samples, speech_starts
+
+
+def segment_starts(transcript: str):
+    """Start times of the `[start - end]: text` lines of a transcript"""
+    return [float(line[1:line.index('s')]) for line in transcript.splitlines()]
+
+
+def test_chunked_transcription(minutes: float = 12, max_workers: int = 4):
+    """Chunked transcription stitches every segment back at its true offset"""
+    print(f"🎙️  Testing chunked transcription ({minutes:g} min, {max_workers} workers)...\n")
+    
+    samples, speech_starts = synthetic_speech(minutes)
+    
+    with StandInTranscriptionServer() as server:
+        start_time = time.time()
+        single = transcribe_with_whisper_groq(encode_wav(samples), "stand-in", "audio.wav", base_url=server.url)
+        single_seconds = time.time() - start_time
+        
+        server.peak_concurrency = 0
+        requests_before = server.requests
+        start_time = time.time()
+        chunked = transcribe_pcm(samples, "stand-in", max_workers=max_workers, base_url=server.url)
+        chunked_seconds = time.time() - start_time
+        chunk_requests = server.requests - requests_before
+    
+    starts = segment_starts(chunked or "")
+    max_error = max((min(abs(start - truth) for start in starts) for truth in speech_starts), default=None)
+    
+    print(f"\n   Single request: {single_seconds:6.2f}s" + ("" if single else " (failed)"))
+    print(f"   Chunked:        {chunked_seconds:6.2f}s, {chunk_requests} chunks, "
+          f"{server.peak_concurrency} in flight at peak")
+    print(f"   Segments:       {len(starts)} stitched for {len(speech_starts)} bursts"
+          + (f", max start error {max_error:.2f}s" if max_error is not None else "") + "\n")
+    
+    checks = [
+        (chunk_requests > 1, "audio was not split into several chunks"),
+        (len(starts) == len(speech_starts), "segment count does not match the speech bursts"),
+        # Transcript times are printed to 0.1s and the VAD works in whole frames
+        (max_error is not None and max_error <= 0.1 + VAD_FRAME_SECONDS, "stitched offsets are wrong"),
+        (starts == sorted(starts), "segments are out of order"),
+        (1 < server.peak_concurrency <= max_workers, "chunks did not run in parallel within max_workers"),
+    ]
+    failures = [message for ok, message in checks if not ok]
+    for message in failures:
+        print(f"❌ {message}")
+    if failures:
+        print()
+        return False
+    
+    print("✅ Chunked transcription OK\n")
+    return True
+
+
+def test_upload_limit(minutes: float = 20):
+    """Audio too large for one upload still transcribes in chunks"""
+    print(f"📦 Testing audio over the upload limit ({minutes:g} min)...\n")
+    
+    samples, speech_starts = synthetic_speech(minutes, seed=1)
+    
+    with StandInTranscriptionServer(seconds_per_audio_second=0) as server:
+        single = transcribe_with_whisper_groq(encode_wav(samples), "stand-in", "audio.wav", base_url=server.url)
+        chunked = transcribe_pcm(samples, "stand-in", base_url=server.url)
+    
+    print()
+    if single is not None:
+        print("❌ The stand-in accepted an upload over the limit\n")
+        return False
+    if not chunked or len(segment_starts(chunked)) != len(speech_starts):
+        print("❌ Chunked transcription lost segments\n")
+        return False
+    
+    print("✅ Upload limit OK\n")
+    return True
+
+
+def test_failed_chunks(minutes: float = 12):
+    """Failed chunks are retried once, and a lasting failure leaves a visible marker"""
+    print("💥 Testing failed chunks...\n")
+    
+    samples, speech_starts = synthetic_speech(minutes)
+    
+    # One failure: the retry recovers the chunk
+    with StandInTranscriptionServer(seconds_per_audio_second=0, fail_first=1) as server:
+        recovered = transcribe_pcm(samples, "stand-in", base_url=server.url) or ""
+    
+    # The short last chunk always fails: its range is marked
+    with StandInTranscriptionServer(seconds_per_audio_second=0, fail_under_seconds=200) as server:
+        marked = transcribe_pcm(samples, "stand-in", base_url=server.url) or ""
+    
+    markers = [line for line in marked.splitlines() if line.endswith(FAILED_CHUNK_TEXT)]
+    marker_start = float(markers[0][1:markers[0].index('s')]) if markers else None
+    
+    print()
+    checks = [
+        (len(segment_starts(recovered)) == len(speech_starts) and FAILED_CHUNK_TEXT not in recovered,
+         "a chunk that failed once was not recovered by the retry"),
+        (len(markers) == 1, "a chunk that kept failing was not marked"),
+        (markers and marked.splitlines()[-1] == markers[0], "the marker is not at the failed chunk's position"),
+        (marker_start is not None and all(start < marker_start for start in segment_starts(marked)[:-1]),
+         "segments before the failed chunk are missing or out of order"),
+    ]
+    failures = [message for ok, message in checks if not ok]
+    for message in failures:
+        print(f"❌ {message}")
+    if failures:
+        print()
+        return False
+    
+    print(f"   Marker: {markers[0]}\n")
+    print("✅ Failed chunks OK\n")
+    return True
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("  Chunked Transcription Test (stand-in server)")
+    print("=" * 60)
+    print()
+    
+    results = [test_chunked_transcription(), test_upload_limit(), test_failed_chunks()]
+    
+    print("=" * 60)
+    if all(results):
+        print("✅ All tests passed!")
+    else:
+        print("⚠️  Some tests failed, check the messages above")
+    print("=" * 60)
+    
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Video Probe Module
+Reads container, stream and codec metadata once per file and caches it
+for every pipeline stage
+"""
+
+import json
+import os
+import subprocess
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+
+# Probe results keyed by (absolute path, file size, modification time)
+_probe_cache: Dict[Tuple[str, int, int], Dict] = {}
+_keyframe_cache: Dict[Tuple[str, int, int], List[float]] = {}
+_cache_lock = threading.Lock()
+
+
+def probe_video(video_path: str) -> Dict:
+    """
+    Get video metadata, reading the file only on the first call
+    
+    Uses ffprobe when available and falls back to OpenCV (which cannot
+    tell whether the file has audio).
+    
+    Args:
+        video_path: Path to the video file
+    
+    Returns:
+        Dictionary with:
+        {
+            "duration": seconds,
+            "fps": frames_per_second,
+            "total_frames": int,
+            "width": int,
+            "height": int,
+            "resolution": "WIDTHxHEIGHT",
+            "container": format name (or None),
+            "video_codec": codec name (or None),
+            "has_audio": True/False (None if unknown),
+            "audio_codec": codec name (or None),
+            "size_bytes": int
+        }
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+    
+    key = _cache_key(video_path)
+    with _cache_lock:
+        if key in _probe_cache:
+            return _probe_cache[key]
+    
+    info = _probe_with_ffprobe(video_path)
+    if info is None:
+        info = _probe_with_opencv(video_path)
+    info["size_bytes"] = key[1]
+    
+    with _cache_lock:
+        _probe_cache[key] = info
+    
+    return info
+
+
+def get_keyframe_times(video_path: str) -> List[float]:
+    """
+    Get the presentation timestamps of all video keyframes
+    
+    Only demuxes packets (no decoding), and is cached like probe_video().
+    
+    Args:
+        video_path: Path to the video file
+    
+    Returns:
+        Sorted list of keyframe timestamps in seconds (empty if unavailable)
+    """
+    key = _cache_key(video_path)
+    with _cache_lock:
+        if key in _keyframe_cache:
+            return _keyframe_cache[key]
+    
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=print_section=0',
+        video_path
+    ]
+    
+    keyframes = []
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            for line in result.stdout.splitlines():
+                pts_time, _, flags = line.partition(',')
+                if 'K' in flags and pts_time not in ('', 'N/A'):
+                    keyframes.append(float(pts_time))
+    except FileNotFoundError:
+        pass
+    
+    keyframes.sort()
+    with _cache_lock:
+        _keyframe_cache[key] = keyframes
+    
+    return keyframes
+
+
+def clear_probe_cache():
+    """Forget all cached probe results"""
+    with _cache_lock:
+        _probe_cache.clear()
+        _keyframe_cache.clear()
+
+
+def _cache_key(video_path: str) -> Tuple[str, int, int]:
+    """Cache key that changes whenever the file is replaced or modified"""
+    stat = os.stat(video_path)
+    return os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns
+
+
+def _probe_with_ffprobe(video_path: str) -> Optional[Dict]:
+    """Read metadata with a single ffprobe call (None if ffprobe is unavailable)"""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_format',
+        '-show_streams',
+        '-of', 'json',
+        video_path
+    ]
+    
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    
+    if result.returncode != 0:
+        raise ValueError(f"Cannot open video: {video_path} ({result.stderr.strip()})")
+    
+    data = json.loads(result.stdout)
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    
+    if video is None:
+        raise ValueError(f"No video stream found: {video_path}")
+    
+    fps = _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate"))
+    duration = float(data.get("format", {}).get("duration") or video.get("duration") or 0)
+    width = int(video.get("width", 0))
+    height = int(video.get("height", 0))
+    
+    # Not every container stores a frame count (e.g. WebM)
+    total_frames = int(video.get("nb_frames") or 0) or int(duration * fps)
+    
+    return {
+        "duration": duration,
+        "fps": fps,
+        "total_frames": total_frames,
+        "width": width,
+        "height": height,
+        "resolution": f"{width}x{height}",
+        "container": data.get("format", {}).get("format_name"),
+        "video_codec": video.get("codec_name"),
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None
+    }
+
+
+def _probe_with_opencv(video_path: str) -> Dict:
+    """Fallback metadata reader for hosts without ffprobe"""
+    cap = cv2.VideoCapture(video_path)
+    
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    duration = total_frames / fps if fps > 0 else 0
+    
+    cap.release()
+    
+    return {
+        "duration": duration,
+        "fps": fps,
+        "total_frames": total_frames,
+        "width": width,
+        "height": height,
+        "resolution": f"{width}x{height}",
+        "container": None,
+        "video_codec": None,
+        "has_audio": None,
+        "audio_codec": None
+    }
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """Parse an FFmpeg rational like '30000/1001'"""
+    if not rate:
+        return 0.0
+    numerator, _, denominator = rate.partition('/')
+    try:
+        if denominator:
+            return float(numerator) / float(denominator) if float(denominator) else 0.0
+        return float(numerator)
+    except ValueError:
+        return 0.0
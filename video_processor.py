@@ -4,29 +4,91 @@ Extracts frames from video files at specified intervals
 """
 
 import cv2
-import base64
 import os
+import queue
+import re
 import subprocess
-import tempfile
-from typing import List, Dict
-from pathlib import Path
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Dict, Iterator, Optional, Tuple
+
+from frame import Frame
+from frame_cache import FrameCache
+from frame_quality import sharpness_scores
+from video_probe import probe_video, get_keyframe_times
+
+
+# Presentation timestamp reported by FFmpeg's showinfo filter
+_SHOWINFO_PTS = re.compile(r'pts_time:\s*(-?[0-9.]+)')
+
+# Minimum number of sampled frames per segment for parallel extraction
+MIN_SAMPLES_PER_SEGMENT = 8
+
+# Gap above which batched frame grabbing seeks instead of decoding forward
+# (only used when the keyframe positions are unknown)
+SEEK_GAP_SECONDS = 5
 
 
 class VideoFrameExtractor:
     """Extract frames from video files for SOP generation"""
     
-    def __init__(self, interval_seconds: int = 1, resize_width: int = 512):
+    SAMPLING_MODES = ("interval", "scene", "keyframe")
+    
+    def __init__(
+        self,
+        interval_seconds: int = 1,
+        resize_width: int = 512,
+        sampling_mode: str = "interval",
+        scene_threshold: float = 0.3,
+        min_gap_seconds: float = 1.0,
+        max_gap_seconds: float = 10.0,
+        max_frames: int = None,
+        workers: int = None,
+        cache: FrameCache = None,
+        sharpest_of: int = 1
+    ):
         """
         Initialize the frame extractor
         
         Args:
             interval_seconds: Extract one frame every N seconds
             resize_width: Resize frame width (maintains aspect ratio)
+            sampling_mode: "interval" for fixed-rate sampling, "scene" to
+                pick frames at visual scene/activity changes, or "keyframe" to
+                decode only keyframes (fast for very long videos)
+            scene_threshold: FFmpeg scene score (0-1) that counts as a change
+            min_gap_seconds: Scene mode: minimum time between two frames
+            max_gap_seconds: Scene mode: always take a frame after this long
+            max_frames: Scene mode: overall frame budget (optional)
+            workers: Interval mode: number of timeline segments decoded in
+                parallel (defaults to the CPU core count, 1 disables)
+            cache: Optional FrameCache; extract_frames() returns cached frames
+                when the same video is sampled with the same parameters
+            sharpest_of: Interval mode: decode this many candidate frames per
+                interval and keep only the sharpest one (1 disables)
         """
+        if sampling_mode not in self.SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode: {sampling_mode}")
+        
         self.interval_seconds = interval_seconds
         self.resize_width = resize_width
+        self.sampling_mode = sampling_mode
+        self.scene_threshold = scene_threshold
+        self.min_gap_seconds = min_gap_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.max_frames = max_frames
+        self.workers = workers
+        self.cache = cache
+        self.sharpest_of = max(1, sharpest_of)
+        
+        # Per-stage timings of the last extraction
+        self.last_timings = {"sharpness_scoring": 0.0}
     
-    def extract_frames(self, video_path: str, output_dir: str = None) -> List[Dict]:
+    def extract_frames(self, video_path: str, output_dir: str = None) -> List[Frame]:
         """
         Extract frames from video at specified intervals using FFmpeg
         
@@ -35,7 +97,8 @@ class VideoFrameExtractor:
             output_dir: Directory to save extracted frames (optional)
             
         Returns:
-            List of dictionaries containing frame info:
+            List of Frame objects holding the raw JPEG bytes. Frames also
+            support the old dictionary access:
             [
                 {
                     "id": frame_number,
@@ -53,92 +116,299 @@ class VideoFrameExtractor:
         duration = info['duration']
         
         print(f"Video Info: {duration:.2f}s, {info['fps']:.2f} FPS, {info['total_frames']} frames")
-        print(f"Extracting 1 frame every {self.interval_seconds} seconds using FFmpeg...")
         
-        # Create output directory or use temp directory
+        self.last_timings = {"sharpness_scoring": 0.0}
+        if self.cache:
+            cache_key = self.cache.make_key(video_path, self._cache_params())
+            frames = self.cache.get(cache_key)
+            if frames is not None:
+                print(f"✓ Loaded {len(frames)} frames from cache")
+                if output_dir:
+                    self._save_frames(frames, output_dir)
+                return frames
+        
+        if self.sampling_mode == "scene":
+            print(f"Extracting frames at scene changes "
+                  f"(gap {self.min_gap_seconds}-{self.max_gap_seconds}s) using FFmpeg...")
+        elif self.sampling_mode == "keyframe":
+            print(f"Extracting 1 keyframe every ~{self.interval_seconds} seconds using FFmpeg...")
+        else:
+            print(f"Extracting 1 frame every {self.interval_seconds} seconds using FFmpeg...")
+            if self.sharpest_of > 1:
+                print(f"  Keeping the sharpest of {self.sharpest_of} candidates per interval")
+        
+        frames = []
+        for frame in self.iter_frames(video_path, output_dir):
+            frames.append(frame)
+            print(f"Loaded frame {len(frames)} at {frame.timestamp:.2f}s")
+        
+        print(f"Total frames extracted: {len(frames)}")
+        
+        if self.cache:
+            self.cache.put(cache_key, frames)
+        
+        return frames
+    
+    def _cache_params(self) -> Dict:
+        """Sampling parameters that determine which frames are extracted"""
+        return {
+            "mode": self.sampling_mode,
+            "interval": self.interval_seconds,
+            "width": self.resize_width,
+            "scene_threshold": self.scene_threshold,
+            "min_gap": self.min_gap_seconds,
+            "max_gap": self.max_gap_seconds,
+            "max_frames": self.max_frames,
+            "sharpest_of": self.sharpest_of
+        }
+    
+    def _save_frames(self, frames: List[Frame], output_dir: str):
+        """Write frames to output_dir as frame_NNNNNN.jpg"""
+        os.makedirs(output_dir, exist_ok=True)
+        for frame in frames:
+            frame.image_path = os.path.join(output_dir, f"frame_{frame.id:06d}.jpg")
+            with open(frame.image_path, 'wb') as f:
+                f.write(frame.data)
+    
+    def iter_frames(self, video_path: str, output_dir: str = None) -> Iterator[Frame]:
+        """
+        Stream frames from FFmpeg one at a time without a temp directory
+        
+        FFmpeg writes MJPEG to stdout (image2pipe), and each JPEG is yielded
+        as soon as it is complete, so consumers can start working while the
+        video is still being decoded.
+        
+        Args:
+            video_path: Path to the video file
+            output_dir: Directory to also save extracted frames (optional)
+            
+        Yields:
+            Frame objects in the same format as extract_frames()
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+        
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
-            temp_dir = output_dir
-            cleanup_temp = False
+        
+        max_frames = self.max_frames if self.sampling_mode == "scene" else None
+        
+        self.last_timings = {"sharpness_scoring": 0.0}
+        
+        if self._segment_count(video_path) > 1:
+            samples = self._iter_parallel_samples(video_path)
         else:
-            temp_dir = tempfile.mkdtemp()
-            cleanup_temp = True
+            samples = self._iter_samples(video_path)
+        
+        if self.sampling_mode == "interval" and self.sharpest_of > 1:
+            samples = self._select_sharpest(samples)
         
         try:
-            # Build FFmpeg command
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,
-                '-vf', f'fps=1/{self.interval_seconds},scale={self.resize_width}:-1',
-                '-q:v', '2',  # High quality JPEG
-                '-threads', '0',  # Auto-detect optimal thread count
-                '-loglevel', 'error',  # Only show errors
-                f'{temp_dir}/frame_%06d.jpg'
-            ]
-            
-            # Execute FFmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg error: {result.stderr}")
-            
-            # Load extracted frames
-            frames = []
-            frame_files = sorted(Path(temp_dir).glob('frame_*.jpg'))
-            
-            if not frame_files:
-                raise Exception("No frames were extracted. Check if FFmpeg is installed correctly.")
-            
-            for img_file in frame_files:
-                # Extract frame number from filename (frame_000001.jpg -> 1)
-                frame_num = int(img_file.stem.split('_')[1])
-                timestamp = (frame_num - 1) * self.interval_seconds
-                
-                # Read and encode to base64
-                with open(img_file, 'rb') as f:
-                    image_bytes = f.read()
-                    base64_image = base64.b64encode(image_bytes).decode('utf-8')
+            frame_num = 0
+            for timestamp, image_bytes in samples:
+                frame_num += 1
+                frame = Frame(frame_num, timestamp, image_bytes)
                 
-                frame_info = {
-                    "id": frame_num,
-                    "timestamp": timestamp,
-                    "image_data": base64_image
-                }
-                
-                # Add image path if saving permanently
+                # Save to disk if output_dir specified
                 if output_dir:
-                    frame_info["image_path"] = str(img_file)
+                    frame.image_path = os.path.join(output_dir, f"frame_{frame_num:06d}.jpg")
+                    with open(frame.image_path, 'wb') as f:
+                        f.write(image_bytes)
                 
-                frames.append(frame_info)
-                print(f"Loaded frame {len(frames)} at {timestamp:.2f}s")
+                yield frame
+                
+                if max_frames and frame_num >= max_frames:
+                    print(f"Reached frame budget of {max_frames} frames")
+                    return
             
-            print(f"Total frames extracted: {len(frames)}")
-            return frames
+            if frame_num == 0:
+                raise Exception("No frames were extracted. Check if FFmpeg is installed correctly.")
             
         finally:
-            # Clean up temp directory if created
-            if cleanup_temp and os.path.exists(temp_dir):
-                import shutil
-                shutil.rmtree(temp_dir)
+            # Stops FFmpeg if the consumer abandoned the generator early
+            samples.close()
+    
+    def _iter_samples(self, video_path: str) -> Iterator[Tuple[float, bytes]]:
+        """Decode the whole video in a single FFmpeg process"""
+        # Scene and keyframe modes need FFmpeg's own presentation timestamps
+        report_pts = self.sampling_mode in ("scene", "keyframe")
+        
+        cmd = ['ffmpeg']
+        if self.sampling_mode == "keyframe":
+            # Skip non-key frames inside the decoder
+            cmd += ['-skip_frame', 'nokey']
+        cmd += ['-i', video_path, '-vf', self._build_video_filter(video_path)]
+        if report_pts:
+            # Only emit the frames the select filter kept
+            cmd += ['-vsync', 'vfr']
+        
+        for index, (pts, image_bytes) in enumerate(_run_ffmpeg_pipe(cmd, report_pts)):
+            timestamp = pts if report_pts else index * self._sample_period()
+            yield timestamp, image_bytes
+    
+    def _segment_count(self, video_path: str) -> int:
+        """Number of timeline segments to decode concurrently"""
+        workers = self.workers or os.cpu_count() or 1
+        if workers <= 1 or self.sampling_mode != "interval":
+            # Scene selection depends on the previous frame, so it stays serial
+            return 1
+        
+        duration = self.get_video_info(video_path)['duration']
+        total_samples = int(duration // self._sample_period()) + 1
+        
+        # Short videos are not worth the extra FFmpeg start-up cost
+        return max(1, min(workers, total_samples // MIN_SAMPLES_PER_SEGMENT))
     
-    def extract_frames_opencv(self, video_path: str, output_dir: str = None) -> List[Dict]:
+    def _iter_parallel_samples(self, video_path: str) -> Iterator[Tuple[float, bytes]]:
+        """
+        Decode timeline segments concurrently and merge them in order
+        
+        Each segment is a fast-seeking FFmpeg process (-ss before -i) covering
+        a whole number of sampling intervals, so sample timestamps line up
+        exactly with the serial extraction.
         """
-        Legacy OpenCV method for frame extraction (slower but no FFmpeg dependency)
+        segments = self._segment_count(video_path)
+        duration = self.get_video_info(video_path)['duration']
+        total_samples = int(duration // self._sample_period()) + 1
+        per_segment = -(-total_samples // segments)
+        
+        # Share the cores between the concurrent decoders
+        threads = max(1, (os.cpu_count() or 1) // segments)
+        
+        print(f"Decoding {segments} segments in parallel ({threads} threads each)...")
+        
+        executor = ThreadPoolExecutor(max_workers=segments)
+        try:
+            futures = []
+            for first_index in range(0, total_samples, per_segment):
+                is_last = first_index + per_segment >= total_samples
+                futures.append(executor.submit(
+                    self._extract_segment,
+                    video_path,
+                    first_index,
+                    None if is_last else per_segment,
+                    threads
+                ))
+            
+            # Yield each segment as soon as it and all earlier ones are done
+            for future in futures:
+                first_index, images = future.result()
+                for offset, image_bytes in enumerate(images):
+                    yield (first_index + offset) * self._sample_period(), image_bytes
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _extract_segment(
+        self,
+        video_path: str,
+        first_index: int,
+        count: Optional[int],
+        threads: int
+    ) -> Tuple[int, List[bytes]]:
+        """Extract `count` samples starting at sample `first_index` (None = until the end)"""
+        start = first_index * self._sample_period()
+        
+        cmd = ['ffmpeg', '-ss', f'{start:.3f}']
+        if count is not None:
+            cmd += ['-t', f'{count * self._sample_period():.3f}']
+        cmd += ['-i', video_path, '-vf', self._build_video_filter(video_path)]
+        
+        stream = _run_ffmpeg_pipe(cmd, report_pts=False, threads=threads)
+        try:
+            images = [image_bytes for _, image_bytes in islice(stream, count)]
+        finally:
+            stream.close()
+        
+        return first_index, images
+    
+    def _sample_period(self) -> float:
+        """Seconds between decoded frames (candidates, when picking the sharpest)"""
+        return self.interval_seconds / self.sharpest_of
+    
+    def _select_sharpest(self, samples: Iterator[Tuple[float, bytes]]) -> Iterator[Tuple[float, bytes]]:
+        """
+        Keep the sharpest candidate of each sampling interval
+        
+        Candidates arrive `sharpest_of` per interval; each window is scored
+        in one vectorized pass as soon as it is complete.
+        """
+        period = self._sample_period()
+        window = []
+        current_index = None
+        
+        try:
+            for timestamp, image_bytes in samples:
+                index = int(round(timestamp / period)) // self.sharpest_of
+                if window and index != current_index:
+                    yield self._sharpest(window)
+                    window = []
+                current_index = index
+                window.append((timestamp, image_bytes))
+            
+            if window:
+                yield self._sharpest(window)
+        finally:
+            samples.close()
+    
+    def _sharpest(self, window: List[Tuple[float, bytes]]) -> Tuple[float, bytes]:
+        """Return the candidate with the highest sharpness score"""
+        start_time = time.perf_counter()
+        scores = sharpness_scores([image_bytes for _, image_bytes in window])
+        self.last_timings["sharpness_scoring"] += time.perf_counter() - start_time
+        return window[int(scores.argmax())]
+    
+    def _build_video_filter(self, video_path: str) -> str:
+        """Build the FFmpeg -vf filter chain for the current sampling mode"""
+        scale = f'scale={self.resize_width}:-1'
+        
+        if self.sampling_mode == "interval":
+            return f'fps=1/{self._sample_period()},{scale}'
+        
+        if self.sampling_mode == "keyframe":
+            # Keep the first keyframe in each interval window, anchored to the
+            # interval grid so the sampling never drifts
+            select = (
+                f"isnan(prev_selected_t)"
+                f"+gt(floor(t/{self.interval_seconds}),floor(prev_selected_t/{self.interval_seconds}))"
+            )
+            return f"select='{select}',{scale},showinfo"
+        
+        # Spread the frame budget over the whole video by widening the minimum gap
+        min_gap = self.min_gap_seconds
+        if self.max_frames:
+            duration = self.get_video_info(video_path)['duration']
+            min_gap = max(min_gap, duration / self.max_frames)
+        max_gap = max(self.max_gap_seconds, min_gap)
+        
+        # Keep the first frame, any frame after max_gap, and scene changes
+        # that are at least min_gap after the previously kept frame.
+        # Scoring runs after scaling so it is cheap and matches what is sent.
+        select = (
+            f"isnan(prev_selected_t)"
+            f"+gte(t-prev_selected_t,{max_gap})"
+            f"+gt(scene,{self.scene_threshold})*gte(t-prev_selected_t,{min_gap})"
+        )
+        return f"{scale},select='{select}',showinfo"
+    
+    def extract_frames_opencv(self, video_path: str, output_dir: str = None) -> List[Frame]:
+        """
+        OpenCV method for frame extraction (no FFmpeg dependency)
+        
+        Frames between samples are skipped with grab() (no conversion) or,
+        when a keyframe lies in between, by seeking. Resizing and JPEG
+        encoding run on a worker pool while the next frame is decoded, with
+        a bounded number of frames in flight so memory stays flat.
         
         Args:
             video_path: Path to the video file
             output_dir: Directory to save extracted frames (optional)
             
         Returns:
-            List of dictionaries containing frame info
+            List of Frame objects
         """
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
         
-        # Create output directory if specified
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-        
         # Open video
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
@@ -152,85 +422,80 @@ class VideoFrameExtractor:
         print(f"Video Info: {duration:.2f}s, {fps:.2f} FPS, {total_frames} frames")
         print(f"Extracting 1 frame every {self.interval_seconds} seconds...")
         
+        frame_interval = max(1, int(round(fps * self.interval_seconds)))
+        keyframes = [int(round(t * fps)) for t in get_keyframe_times(video_path)]
+        
+        workers = self.workers or os.cpu_count() or 1
+        max_in_flight = workers * 2
+        executor = ThreadPoolExecutor(max_workers=workers)
+        in_flight = deque()
         frames = []
-        count = 0
-        frame_interval = int(fps * self.interval_seconds)
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Extract frame at specified interval
-            if count % frame_interval == 0:
-                timestamp = count / fps
-                
-                # Resize frame
-                resized_frame = self._resize_frame(frame)
+        def collect_oldest():
+            count, timestamp, future = in_flight.popleft()
+            frames.append(Frame(count, timestamp, future.result()))
+            print(f"Extracted frame {len(frames)} at {timestamp:.2f}s")
+        
+        try:
+            position = 0  # Index of the next frame the decoder will return
+            target = 0
+            while True:
+                if self._should_seek(position, target, keyframes, fps):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    position = target
                 
-                # Encode to JPEG
-                _, buffer = cv2.imencode('.jpg', resized_frame)
-                base64_image = base64.b64encode(buffer).decode('utf-8')
+                # Skip non-sampled frames without converting them
+                while position < target and cap.grab():
+                    position += 1
                 
-                frame_info = {
-                    "id": count,
-                    "timestamp": timestamp,
-                    "image_data": base64_image
-                }
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                position += 1
                 
-                # Save to disk if output_dir specified
-                if output_dir:
-                    frame_filename = f"frame_{count:06d}.jpg"
-                    frame_path = os.path.join(output_dir, frame_filename)
-                    cv2.imwrite(frame_path, resized_frame)
-                    frame_info["image_path"] = frame_path
+                # Resize and encode on the pool while decoding continues
+                in_flight.append((target, target / fps, executor.submit(self._encode_frame, frame)))
+                if len(in_flight) >= max_in_flight:
+                    collect_oldest()
                 
-                frames.append(frame_info)
-                print(f"Extracted frame {len(frames)} at {timestamp:.2f}s")
+                target += frame_interval
             
-            count += 1
+            while in_flight:
+                collect_oldest()
+        finally:
+            cap.release()
+            executor.shutdown(cancel_futures=True)
+        
+        # Save to disk if output_dir specified
+        if output_dir:
+            self._save_frames(frames, output_dir)
         
-        cap.release()
         print(f"Total frames extracted: {len(frames)}")
         
         return frames
     
-    def _resize_frame(self, frame):
+    def _encode_frame(self, frame) -> bytes:
+        """Resize a decoded frame and encode it to JPEG"""
+        _, buffer = cv2.imencode('.jpg', self._resize_frame(frame))
+        return buffer.tobytes()
+    
+    def _resize_frame(self, frame, resize_width: int = None):
         """Resize frame while maintaining aspect ratio"""
+        resize_width = resize_width or self.resize_width
         height, width = frame.shape[:2]
         
-        if width > self.resize_width:
+        if width > resize_width:
             # Calculate new height to maintain aspect ratio
-            ratio = self.resize_width / width
+            ratio = resize_width / width
             new_height = int(height * ratio)
-            resized = cv2.resize(frame, (self.resize_width, new_height))
+            resized = cv2.resize(frame, (resize_width, new_height))
             return resized
         
         return frame
     
     def get_video_info(self, video_path: str) -> Dict:
-        """Get video metadata"""
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            raise ValueError(f"Cannot open video: {video_path}")
-        
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        duration = total_frames / fps if fps > 0 else 0
-        
-        cap.release()
-        
-        return {
-            "duration": duration,
-            "fps": fps,
-            "total_frames": total_frames,
-            "width": width,
-            "height": height,
-            "resolution": f"{width}x{height}"
-        }
+        """Get video metadata (probed once per file, see video_probe.probe_video)"""
+        return probe_video(video_path)
     
     def extract_frame_at_timestamp(self, video_path: str, timestamp: float) -> bytes:
         """
@@ -243,25 +508,350 @@ class VideoFrameExtractor:
         Returns:
             JPEG image as bytes
         """
+        return self.extract_frames_at_timestamps(video_path, [timestamp])[0]
+    
+    def extract_frames_at_timestamps(
+        self,
+        video_path: str,
+        timestamps: List[float],
+        resize_width: int = None
+    ) -> List[bytes]:
+        """
+        Extract full frames at many timestamps in one sorted pass
+        
+        The video is opened once and walked forward in timestamp order.
+        Between two targets the decoder only seeks when a keyframe lies in
+        between (seeking restarts decoding there anyway); otherwise it grabs
+        forward without converting the skipped frames.
+        
+        Args:
+            video_path: Path to video file
+            timestamps: Times in seconds, in any order
+            resize_width: Optional width to resize to (default: full resolution)
+            
+        Returns:
+            JPEG images as bytes, in the same order as `timestamps`
+        """
+        if not timestamps:
+            return []
+        
         cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video: {video_path}")
+        
         fps = cap.get(cv2.CAP_PROP_FPS)
+        keyframes = [int(round(t * fps)) for t in get_keyframe_times(video_path)]
         
-        # Set position to timestamp
-        frame_number = int(timestamp * fps)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        results = [None] * len(timestamps)
+        position = 0  # Index of the next frame the decoder will return
+        last_target = None
+        last_image = None
         
-        ret, frame = cap.read()
-        cap.release()
+        try:
+            for i in sorted(range(len(timestamps)), key=lambda i: timestamps[i]):
+                target = max(0, int(timestamps[i] * fps))
+                
+                # Several steps can share the same frame
+                if target == last_target:
+                    results[i] = last_image
+                    continue
+                
+                if self._should_seek(position, target, keyframes, fps):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    position = target
+                
+                # Skip ahead without decoding into images
+                while position < target and cap.grab():
+                    position += 1
+                
+                ret, frame = cap.read()
+                if not ret:
+                    raise ValueError(f"Could not extract frame at {timestamps[i]}s")
+                position += 1
+                
+                if resize_width:
+                    frame = self._resize_frame(frame, resize_width)
+                
+                # Encode to JPEG
+                _, buffer = cv2.imencode('.jpg', frame)
+                last_target = target
+                last_image = buffer.tobytes()
+                results[i] = last_image
+        finally:
+            cap.release()
         
-        if not ret:
-            raise ValueError(f"Could not extract frame at {timestamp}s")
+        return results
+    
+    def _should_seek(self, position: int, target: int, keyframes: List[int], fps: float) -> bool:
+        """Decide whether seeking beats grabbing forward from `position` to `target`"""
+        if target < position:
+            return True
         
-        # Encode to JPEG
-        _, buffer = cv2.imencode('.jpg', frame)
-        return buffer.tobytes()
+        if keyframes:
+            # Seeking only pays off when it can skip to a later keyframe
+            next_keyframe = bisect_right(keyframes, position)
+            return next_keyframe < len(keyframes) and keyframes[next_keyframe] <= target
+        
+        # No keyframe index available: seek across long gaps only
+        return target - position > fps * SEEK_GAP_SECONDS
+
+
+def _run_ffmpeg_pipe(
+    cmd: List[str],
+    report_pts: bool = False,
+    threads: int = 0
+) -> Iterator[Tuple[Optional[float], bytes]]:
+    """
+    Run an FFmpeg command that writes MJPEG to stdout and yield its images
+    
+    Args:
+        cmd: FFmpeg command up to and including the input and filter options
+        report_pts: Read each frame's timestamp from a showinfo filter
+        threads: FFmpeg thread count (0 = auto-detect)
+        
+    Yields:
+        (presentation timestamp or None, JPEG bytes) tuples
+    """
+    cmd = cmd + [
+        '-f', 'image2pipe',
+        '-vcodec', 'mjpeg',
+        '-q:v', '2',  # High quality JPEG
+        '-threads', str(threads),
+        # showinfo logs at info level; otherwise only show errors
+        '-loglevel', 'info' if report_pts else 'error',
+        '-hide_banner',
+        '-nostats',
+        'pipe:1'
+    ]
+    
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    
+    # Drain stderr on a separate thread so FFmpeg never blocks on a full pipe.
+    # showinfo lines are turned into timestamps, everything else is kept for errors.
+    stderr_lines = []
+    pts_queue = queue.Queue()
+    
+    def read_stderr():
+        for raw_line in process.stderr:
+            line = raw_line.decode('utf-8', errors='replace')
+            match = _SHOWINFO_PTS.search(line) if 'Parsed_showinfo' in line else None
+            if match:
+                pts_queue.put(float(match.group(1)))
+            else:
+                stderr_lines.append(line)
+        pts_queue.put(None)
+    
+    stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+    stderr_thread.start()
+    
+    try:
+        for image_bytes in _iter_jpeg_stream(process.stdout):
+            pts = None
+            if report_pts:
+                pts = pts_queue.get()
+                if pts is None:
+                    raise Exception("FFmpeg did not report a timestamp for every frame")
+            yield pts, image_bytes
+        
+        process.wait()
+        stderr_thread.join()
+        
+        if process.returncode != 0:
+            raise Exception(f"FFmpeg error: {''.join(stderr_lines)}")
+        
+    finally:
+        # Stop FFmpeg if the consumer stopped reading early
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
+def _find_jpeg_end(buffer: bytearray, start: int) -> int:
+    """
+    Find the end of the JPEG image starting at `start` in `buffer`
+    
+    Walks the marker segments instead of searching for the first FFD9,
+    so table data can never be mistaken for the end-of-image marker.
+    
+    Returns:
+        Index just past the EOI marker, or -1 if the image is incomplete
+    """
+    pos = start + 2
+    size = len(buffer)
+    
+    while pos + 1 < size:
+        if buffer[pos] != 0xFF:
+            raise ValueError("Corrupt JPEG stream from FFmpeg")
+        
+        marker = buffer[pos + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            pos += 1
+            continue
+        if marker == 0xD9:
+            return pos + 2
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            # Standalone markers carry no length
+            pos += 2
+            continue
+        if pos + 3 >= size:
+            return -1
+        
+        pos += 2 + ((buffer[pos + 2] << 8) | buffer[pos + 3])
+        
+        if marker == 0xDA:
+            # Skip entropy-coded scan data up to the next real marker
+            while True:
+                idx = buffer.find(b'\xff', pos)
+                if idx < 0 or idx + 1 >= size:
+                    return -1
+                following = buffer[idx + 1]
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    pos = idx + 2
+                elif following == 0xFF:
+                    pos = idx + 1
+                else:
+                    pos = idx
+                    break
+    
+    return -1
+
+
+def _iter_jpeg_stream(stream, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    """Split a concatenated MJPEG byte stream into individual JPEG images"""
+    buffer = bytearray()
+    
+    while True:
+        chunk = stream.read1(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        
+        while True:
+            start = buffer.find(b'\xff\xd8')
+            if start < 0:
+                break
+            end = _find_jpeg_end(buffer, start)
+            if end < 0:
+                # Drop any garbage before the image and wait for more data
+                del buffer[:start]
+                break
+            yield bytes(buffer[start:end])
+            del buffer[:end]
+
+
+def make_synthetic_video(
+    output_path: str,
+    duration_seconds: int = 600,
+    resolution: str = "1280x720",
+    fps: int = 30
+) -> str:
+    """
+    Create a synthetic H.264 test video with FFmpeg's testsrc2 source
+    
+    Args:
+        output_path: Where to write the video
+        duration_seconds: Video length
+        resolution: Frame size (WIDTHxHEIGHT)
+        fps: Frame rate
+        
+    Returns:
+        Path to the created video
+    """
+    cmd = [
+        'ffmpeg', '-y',
+        '-f', 'lavfi',
+        '-i', f'testsrc2=size={resolution}:rate={fps}:duration={duration_seconds}',
+        '-c:v', 'libx264',
+        '-pix_fmt', 'yuv420p',
+        '-loglevel', 'error',
+        output_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg error: {result.stderr}")
+    return output_path
+
+
+def benchmark_workers(
+    video_path: str,
+    worker_counts: Tuple[int, ...] = (1, 2, 4, 8),
+    interval_seconds: int = 2
+) -> Dict[int, float]:
+    """
+    Measure extraction time for different degrees of parallelism
+    
+    Args:
+        video_path: Video to extract from
+        worker_counts: Worker counts to try
+        interval_seconds: Sampling interval
+        
+    Returns:
+        Dictionary mapping worker count to elapsed seconds
+    """
+    timings = {}
+    for workers in worker_counts:
+        extractor = VideoFrameExtractor(interval_seconds=interval_seconds, workers=workers)
+        start_time = time.time()
+        frame_count = sum(1 for _ in extractor.iter_frames(video_path))
+        timings[workers] = time.time() - start_time
+    
+    print("\n" + "=" * 60)
+    print(f"PARALLEL EXTRACTION BENCHMARK ({frame_count} frames)")
+    print("=" * 60)
+    baseline = timings[worker_counts[0]]
+    for workers, elapsed in timings.items():
+        print(f"  {workers:>2} workers: {elapsed:6.2f}s  ({baseline / elapsed:.2f}x)")
+    print("=" * 60)
+    
+    return timings
+
+
+def benchmark_opencv_fallback(video_path: str, interval_seconds: int = 2) -> Dict[str, float]:
+    """
+    Compare the OpenCV fallback extractor with the FFmpeg path
+    
+    Args:
+        video_path: Video to extract from
+        interval_seconds: Sampling interval
+        
+    Returns:
+        Dictionary with elapsed seconds for "ffmpeg" and "opencv"
+    """
+    extractor = VideoFrameExtractor(interval_seconds=interval_seconds)
+    timings = {}
+    
+    start_time = time.time()
+    sum(1 for _ in extractor.iter_frames(video_path))
+    timings["ffmpeg"] = time.time() - start_time
+    
+    start_time = time.time()
+    extractor.extract_frames_opencv(video_path)
+    timings["opencv"] = time.time() - start_time
+    
+    print("\n" + "=" * 60)
+    print("OPENCV FALLBACK BENCHMARK")
+    print("=" * 60)
+    print(f"  FFmpeg: {timings['ffmpeg']:6.2f}s")
+    print(f"  OpenCV: {timings['opencv']:6.2f}s  ({timings['opencv'] / timings['ffmpeg']:.2f}x FFmpeg)")
+    print("=" * 60)
+    
+    return timings
 
 
 if __name__ == "__main__":
+    import sys
+    
+    if "--benchmark" in sys.argv:
+        # Scaling curve on a synthetic 10-minute 720p video
+        import tempfile
+        with tempfile.TemporaryDirectory() as temp_dir:
+            video_path = make_synthetic_video(os.path.join(temp_dir, "synthetic.mp4"))
+            benchmark_workers(video_path)
+            benchmark_opencv_fallback(video_path)
+        sys.exit(0)
+    
     # Test the extractor
     extractor = VideoFrameExtractor(interval_seconds=2)
     
@@ -24,6 +24,14 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 app.config['GENERATED_FOLDER'] = os.path.join(os.path.dirname(__file__), 'generated_sops')
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
+app.config['FRAME_CACHE_FOLDER'] = os.getenv(
+    'SOP_FRAME_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'frame_cache')
+)
+# Shared by every worker process, so concurrent jobs respect one API quota
+app.config['RATE_LIMIT_DB'] = os.path.join(os.path.dirname(__file__), 'rate_limit.db')
+app.config['LLM_CACHE_FOLDER'] = os.getenv(
+    'SOP_LLM_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'llm_cache')
+)
 
 # Allowed video extensions
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm', 'mkv'}
@@ -86,6 +94,47 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+_llm_cache = None
+_rate_limiter = None
+_analyzer = None
+
+
+def get_llm_cache():
+    """Shared AI response cache, so hit rates accumulate across requests"""
+    global _llm_cache
+    if _llm_cache is None:
+        from llm_cache import ResponseCache
+        _llm_cache = ResponseCache(app.config['LLM_CACHE_FOLDER'])
+    return _llm_cache
+
+
+def get_rate_limiter():
+    """
+    Process-wide rate limiter backed by a state file shared across workers
+    (None, i.e. unthrottled, unless a limit is configured)
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        from rate_limiter import RateLimiter
+        configured = os.getenv("SOP_RATE_LIMIT_RPM") or os.getenv("SOP_RATE_LIMIT_TPM")
+        _rate_limiter = RateLimiter.from_env(
+            default_state_path=app.config['RATE_LIMIT_DB'] if configured else None
+        )
+    return _rate_limiter
+
+
+def get_analyzer():
+    """
+    Process-wide SOP analyzer, so concurrent uploads share one model client,
+    response cache and rate limiter
+    """
+    global _analyzer
+    if _analyzer is None:
+        from sop_analyzer import SOPAnalyzer
+        _analyzer = SOPAnalyzer(cache=get_llm_cache(), rate_limiter=get_rate_limiter())
+    return _analyzer
+
+
 # Routes
 @app.route('/')
 def index():
@@ -224,8 +273,12 @@ def generate_sop():
             try:
                 # Import SOP generator
                 from video_processor import VideoFrameExtractor
-                from sop_analyzer import SOPAnalyzer
                 from pdf_generator import SOPPDFGenerator
+                from frame_dedup import FrameDeduplicator
+                from frame_cache import FrameCache
+                from llm_cache import print_response_cache_stats
+                from frame_budget import plan_sampling, print_plan
+                from video_probe import probe_video
                 from whisper_transcription import transcribe_video_audio
                 import time
                 from dotenv import load_dotenv
@@ -235,15 +288,32 @@ def generate_sop():
                 # Process video
                 start_time = time.time()
                 
-                video_processor = VideoFrameExtractor(interval_seconds=2)
-                analyzer = SOPAnalyzer()
+                llm_cache = get_llm_cache()
+                analyzer = get_analyzer()
                 pdf_generator = SOPPDFGenerator()
                 
-                # Extract frames
-                frames_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'frames_{timestamp}')
-                os.makedirs(frames_dir, exist_ok=True)
+                # Size sampling to the video length and the model's token limits
+                video_info = probe_video(video_path)
+                plan = plan_sampling(
+                    video_info['duration'],
+                    video_info['width'],
+                    video_info['height'],
+                    tokens_per_tile=analyzer.image_tile_tokens
+                )
+                print_plan(plan, video_info['duration'])
                 
-                frames = video_processor.extract_frames(video_path, output_dir=frames_dir)
+                video_processor = VideoFrameExtractor(
+                    interval_seconds=plan['interval_seconds'],
+                    resize_width=plan['resize_width'],
+                    cache=FrameCache(app.config['FRAME_CACHE_FOLDER'])
+                )
+                
+                # Extract frames (re-uploads of the same video hit the frame cache)
+                frames = video_processor.extract_frames(video_path)
+                
+                # Drop near-duplicate frames before analysis
+                deduplicator = FrameDeduplicator(max_distance=plan['dedup_distance'])
+                frames, dedup_report = deduplicator.deduplicate(frames)
                 
                 # Extract audio transcript
                 audio_transcript = ""
@@ -252,21 +322,20 @@ def generate_sop():
                     audio_transcript = transcribe_video_audio(video_path, groq_api_key) or ""
                 
                 # Analyze and generate SOP
+                # (identical re-runs are answered from the response cache;
+                # concurrent uploads wait on the shared rate limiter)
                 sop_data = analyzer.analyze_video_frames(frames, context, audio_transcript)
+                print_response_cache_stats(llm_cache.stats())
                 
                 # Generate PDF with company name
                 pdf_generator.generate_sop_pdf(
                     sop_data,
                     frames,
                     pdf_path,
-                    current_user.company_name
+                    current_user.company_name,
+                    timestamp_map=dedup_report['timestamp_map']
                 )
                 
-                # Cleanup frames
-                import shutil
-                if os.path.exists(frames_dir):
-                    shutil.rmtree(frames_dir)
-                
                 processing_time = time.time() - start_time
                 
                 # Save to database
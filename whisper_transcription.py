@@ -3,10 +3,45 @@ Whisper Audio Transcription using Groq API
 High-quality audio transcription for video files
 """
 
+import bisect
+import io
 import os
 import subprocess
 import tempfile
-from typing import Optional
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+# Encoder settings and upload filename for each in-memory audio format
+AUDIO_FORMATS = {
+    # Lossless and cheap to encode; the format Groq recommends for speech
+    "flac": (['-c:a', 'flac', '-f', 'flac'], "audio.flac"),
+    # Lossy but about 4x smaller than FLAC, for long recordings
+    "opus": (['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip', '-f', 'ogg'], "audio.ogg"),
+    "mp3": (['-c:a', 'libmp3lame', '-f', 'mp3'], "audio.mp3"),
+}
+
+# Groq rejects larger uploads on the free tier
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+
+# Chunked transcription of long recordings
+SAMPLE_RATE = 16000
+DEFAULT_CHUNK_SECONDS = 300  # 5-minute WAV chunks are about 9.6 MB
+DEFAULT_TRANSCRIPTION_WORKERS = 4
+
+# Energy VAD: frame length, frames this far above the noise floor are
+# speech, and the shortest pause a chunk may be split at
+VAD_FRAME_SECONDS = 0.03
+VAD_NOISE_RATIO = 3.0
+VAD_MIN_RMS = 100.0  # About -50 dBFS
+MIN_SILENCE_SECONDS = 0.3
+
+# Transcript text for a chunk that could not be transcribed
+FAILED_CHUNK_TEXT = "(transcription failed)"
 
 
 def extract_audio_from_video(video_path: str, output_audio_path: str = None) -> Optional[str]:
@@ -66,13 +101,94 @@ def extract_audio_from_video(video_path: str, output_audio_path: str = None) ->
         return None
 
 
-def transcribe_with_whisper_groq(audio_path: str, groq_api_key: str) -> Optional[str]:
+def extract_audio_bytes(video_path: str, audio_format: str = "flac") -> Optional[bytes]:
+    """
+    Extract 16 kHz mono audio straight into memory
+    
+    FFmpeg writes to a pipe, so no temporary file is created.
+    
+    Args:
+        video_path: Path to video file
+        audio_format: "flac", "opus" or "mp3"
+    
+    Returns:
+        Encoded audio, or None if extraction failed
+    """
+    codec_args, _ = AUDIO_FORMATS[audio_format]
+    
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe
+        
+        cmd = [
+            get_ffmpeg_exe(),
+            '-v', 'error',
+            '-i', video_path,
+            '-vn',  # No video
+            '-ar', '16000',  # 16kHz sample rate (good for speech)
+            '-ac', '1',  # Mono
+            *codec_args,
+            'pipe:1'
+        ]
+        
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        
+        if result.returncode == 0 and result.stdout:
+            return result.stdout
+        
+        print(f"⚠️  Error extracting audio: {result.stderr.decode()}")
+        return None
+    
+    except Exception as e:
+        print(f"❌ Error extracting audio: {e}")
+        return None
+
+
+def extract_audio_for_upload(video_path: str) -> Optional[tuple]:
+    """
+    Extract audio as FLAC, switching to Opus if FLAC exceeds the upload limit
+    
+    Args:
+        video_path: Path to video file
+    
+    Returns:
+        (audio_bytes, upload_filename), or None if extraction failed
+    """
+    print("Extracting audio from video...")
+    
+    audio = extract_audio_bytes(video_path, "flac")
+    audio_format = "flac"
+    if audio is not None and len(audio) > MAX_UPLOAD_BYTES:
+        print(f"⚠️  FLAC audio is {len(audio) / 1024 ** 2:.1f} MB, over the upload limit; using Opus")
+        audio = extract_audio_bytes(video_path, "opus")
+        audio_format = "opus"
+    
+    if audio is None:
+        return None
+    
+    print(f"✓ Audio extracted: {len(audio) / 1024:.0f} KB {audio_format.upper()} (in memory)")
+    return audio, AUDIO_FORMATS[audio_format][1]
+
+
+def transcribe_with_whisper_groq(
+    audio: Union[str, bytes],
+    groq_api_key: str,
+    filename: str = "audio.flac",
+    base_url: Optional[str] = None
+) -> Optional[str]:
     """
     Transcribe audio using Whisper via Groq API
     
     Args:
-        audio_path: Path to audio file
+        audio: Path to audio file, or encoded audio bytes
         groq_api_key: Groq API key
+        filename: Upload filename for audio bytes (its extension tells
+            Groq the format)
+        base_url: Transcription server (default: GROQ_BASE_URL, else Groq)
         
     Returns:
         Transcribed text
@@ -82,15 +198,14 @@ def transcribe_with_whisper_groq(audio_path: str, groq_api_key: str) -> Optional
         
         print("Transcribing audio with Whisper (Groq)...")
         
-        client = Groq(api_key=groq_api_key)
+        client = Groq(api_key=groq_api_key, base_url=base_url)
         
-        with open(audio_path, "rb") as file:
-            transcription = client.audio.transcriptions.create(
-                file=(audio_path, file.read()),
-                model="whisper-large-v3",
-                temperature=0,
-                response_format="verbose_json",
-            )
+        if isinstance(audio, str):
+            filename = audio
+            with open(audio, "rb") as file:
+                audio = file.read()
+        
+        transcription = _request_transcription(client, audio, filename)
         
         # Get full transcript text
         transcript = transcription.text
@@ -121,13 +236,283 @@ def transcribe_with_whisper_groq(audio_path: str, groq_api_key: str) -> Optional
         return None
 
 
-def transcribe_video_audio(video_path: str, groq_api_key: str) -> Optional[str]:
+def _request_transcription(client, audio: bytes, filename: str):
+    """One verbose_json Whisper request (segments carry timestamps)"""
+    return client.audio.transcriptions.create(
+        file=(filename, audio),
+        model="whisper-large-v3",
+        temperature=0,
+        response_format="verbose_json",
+    )
+
+
+def decode_pcm(video_path: str) -> Optional[np.ndarray]:
+    """
+    Decode the audio track to 16 kHz mono 16-bit PCM in memory
+    
+    Args:
+        video_path: Path to video file
+    
+    Returns:
+        Samples as an int16 array, or None if decoding failed
+    """
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe
+        
+        cmd = [
+            get_ffmpeg_exe(),
+            '-v', 'error',
+            '-i', video_path,
+            '-vn',  # No video
+            '-ar', str(SAMPLE_RATE),
+            '-ac', '1',  # Mono
+            '-f', 's16le',  # Raw samples, no container
+            'pipe:1'
+        ]
+        
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        
+        if result.returncode == 0 and result.stdout:
+            return np.frombuffer(result.stdout, dtype=np.int16)
+        
+        print(f"⚠️  Error decoding audio: {result.stderr.decode()}")
+        return None
+    
+    except Exception as e:
+        print(f"❌ Error decoding audio: {e}")
+        return None
+
+
+def voice_activity(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Energy-based voice activity per VAD frame
+    
+    A frame counts as voiced when its RMS is well above the recording's
+    noise floor (the 10th percentile of frame RMS), or at least half the
+    level of its loud frames.
+    
+    Args:
+        samples: int16 PCM samples
+        sample_rate: Sample rate of `samples`
+    
+    Returns:
+        Boolean array with one entry per VAD_FRAME_SECONDS frame
+    """
+    frame_length = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    
+    frames = samples[:count * frame_length].astype(np.float32).reshape(count, frame_length)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    
+    # The absolute floor keeps digital silence from making every hiss "speech";
+    # the cap keeps audio without pauses (floor == speech level) from being
+    # treated as all silence
+    noise_floor = float(np.percentile(rms, 10))
+    loud_level = float(np.percentile(rms, 90))
+    threshold = min(max(noise_floor * VAD_NOISE_RATIO, VAD_MIN_RMS), loud_level / 2)
+    return rms > threshold
+
+
+def find_silences(voiced: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    Silent stretches of at least MIN_SILENCE_SECONDS
+    
+    Args:
+        voiced: Output of voice_activity()
+        sample_rate: Sample rate the VAD ran at
+    
+    Returns:
+        (start_sample, end_sample) of each silence, in order
+    """
+    frame_length = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+    min_frames = max(1, int(MIN_SILENCE_SECONDS / VAD_FRAME_SECONDS))
+    
+    # Pad with voiced frames so every silence has both a start and an end edge
+    edges = np.diff(np.concatenate(([1], voiced.astype(np.int8), [1])))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    
+    return [
+        (int(start) * frame_length, int(end) * frame_length)
+        for start, end in zip(starts, ends)
+        if end - start >= min_frames
+    ]
+
+
+def split_at_silences(
+    samples: np.ndarray,
+    max_chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+    sample_rate: int = SAMPLE_RATE
+) -> List[Tuple[int, int]]:
+    """
+    Split audio into chunks no longer than `max_chunk_seconds`
+    
+    Each chunk ends in the middle of the latest silence that falls in the
+    second half of the allowed length, so words are never cut; with no such
+    silence the chunk is cut at the limit. Chunks without any speech are
+    left out.
+    
+    Args:
+        samples: int16 PCM samples
+        max_chunk_seconds: Upper bound on chunk length
+        sample_rate: Sample rate of `samples`
+    
+    Returns:
+        (start_sample, end_sample) of each chunk to transcribe
+    """
+    voiced = voice_activity(samples, sample_rate)
+    cut_points = [(start + end) // 2 for start, end in find_silences(voiced, sample_rate)]
+    max_length = max(1, int(max_chunk_seconds * sample_rate))
+    
+    chunks = []
+    start = 0
+    while len(samples) - start > max_length:
+        limit = start + max_length
+        i = bisect.bisect_right(cut_points, limit) - 1
+        cut = cut_points[i] if i >= 0 and cut_points[i] > start + max_length // 2 else limit
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, len(samples)))
+    
+    frame_length = max(1, int(sample_rate * VAD_FRAME_SECONDS))
+    return [
+        (start, end) for start, end in chunks
+        if voiced[start // frame_length:-(-end // frame_length)].any()
+    ]
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Wrap int16 mono PCM in a WAV header (no encoding work, unlike FLAC)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def transcribe_pcm(
+    samples: np.ndarray,
+    groq_api_key: str,
+    max_chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+    max_workers: int = DEFAULT_TRANSCRIPTION_WORKERS,
+    base_url: Optional[str] = None
+) -> Optional[str]:
+    """
+    Transcribe long audio as silence-split chunks in parallel
+    
+    Segment timestamps are shifted by each chunk's offset, so the result
+    reads like a single transcription of the whole track. Failed chunks are
+    retried once; a chunk that fails again appears as a single
+    "(transcription failed)" segment spanning it.
+    
+    Args:
+        samples: 16 kHz mono int16 PCM samples
+        groq_api_key: Groq API key
+        max_chunk_seconds: Upper bound on chunk length (WAV chunks must stay
+            under the upload limit)
+        max_workers: Chunks transcribed at once
+        base_url: Transcription server (default: GROQ_BASE_URL, else Groq)
+    
+    Returns:
+        Timestamped transcript, or None if every chunk failed
+    """
+    from groq import Groq
+    
+    max_chunk_seconds = min(max_chunk_seconds, MAX_UPLOAD_BYTES / (2 * SAMPLE_RATE) - 1)
+    chunks = split_at_silences(samples, max_chunk_seconds)
+    if not chunks:
+        print("⚠️  No speech detected in the audio track")
+        return None
+    
+    print(f"Transcribing {len(chunks)} audio chunks with Whisper (Groq), {max_workers} at a time...")
+    
+    # One client (and connection pool) shared by all workers
+    client = Groq(api_key=groq_api_key, base_url=base_url)
+    
+    def transcribe_chunk(chunk: Tuple[int, int]) -> List[Tuple[float, float, str]]:
+        start, end = chunk
+        transcription = _request_transcription(client, encode_wav(samples[start:end]), "audio.wav")
+        offset = start / SAMPLE_RATE
+        
+        segments = getattr(transcription, 'segments', None)
+        if not segments:
+            # No timestamps; the text spans the whole chunk
+            text = transcription.text.strip()
+            return [(offset, end / SAMPLE_RATE, text)] if text else []
+        
+        return [
+            (offset + segment.get('start', 0), offset + segment.get('end', 0), segment.get('text', '').strip())
+            for segment in segments
+        ]
+    
+    def collect(futures: Dict[int, object]) -> Dict[int, object]:
+        """Segments of each chunk, or the exception it raised"""
+        results = {}
+        for i, future in futures.items():
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = e
+        return results
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = collect({i: executor.submit(transcribe_chunk, chunk) for i, chunk in enumerate(chunks)})
+        
+        # Retry failed chunks once (e.g. a dropped connection)
+        retry = [i for i, result in results.items() if isinstance(result, Exception)]
+        if retry:
+            print(f"⚠️  Retrying {len(retry)} failed chunk(s)...")
+            results.update(collect({i: executor.submit(transcribe_chunk, chunks[i]) for i in retry}))
+    
+    segments = []
+    failed = 0
+    for i, (start, end) in enumerate(chunks):
+        if isinstance(results[i], Exception):
+            failed += 1
+            print(f"⚠️  Chunk {start / SAMPLE_RATE:.1f}s - {end / SAMPLE_RATE:.1f}s failed: {results[i]}")
+            # Mark the gap so the analyzer knows speech is missing there
+            segments.append((start / SAMPLE_RATE, end / SAMPLE_RATE, FAILED_CHUNK_TEXT))
+        else:
+            segments.extend(results[i])
+    
+    if failed == len(chunks):
+        print("❌ Error during transcription: every chunk failed")
+        return None
+    
+    print(f"✓ Transcription complete with {len(segments) - failed} timestamped segments "
+          f"from {len(chunks) - failed}/{len(chunks)} chunks")
+    return "\n".join(
+        f"[{start_time:.1f}s - {end_time:.1f}s]: {text}"
+        for start_time, end_time, text in segments
+    )
+
+
+def transcribe_video_audio(
+    video_path: str,
+    groq_api_key: str,
+    max_chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+    max_workers: int = DEFAULT_TRANSCRIPTION_WORKERS
+) -> Optional[str]:
     """
     Complete pipeline: Extract audio from video and transcribe it
     
+    Audio longer than `max_chunk_seconds` is split at silences and the
+    chunks are transcribed in parallel.
+    
     Args:
         video_path: Path to video file
         groq_api_key: Groq API key
+        max_chunk_seconds: Longest audio sent in one request
+        max_workers: Chunks transcribed at once
         
     Returns:
         Transcribed text
@@ -136,31 +521,86 @@ def transcribe_video_audio(video_path: str, groq_api_key: str) -> Optional[str]:
     print("AUDIO TRANSCRIPTION (Whisper via Groq)")
     print("=" * 60)
     
-    # Step 1: Extract audio
-    audio_path = extract_audio_from_video(video_path)
-    
-    if not audio_path:
+    # Skip files without an audio stream before launching FFmpeg
+    from video_probe import probe_video
+    probe = probe_video(video_path)
+    if probe["has_audio"] is False:
+        print("⚠️  Video has no audio stream, skipping transcription")
         return None
     
-    try:
-        # Step 2: Transcribe with Whisper
-        transcript = transcribe_with_whisper_groq(audio_path, groq_api_key)
-        
-        # Clean up temporary audio file
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-            print("✓ Temporary audio file cleaned up")
-        
-        return transcript
-        
-    except Exception as e:
-        print(f"❌ Error during transcription: {e}")
-        
-        # Clean up
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-        
+    if probe["duration"] > max_chunk_seconds:
+        print("Decoding audio for chunked transcription...")
+        samples = decode_pcm(video_path)
+        if samples is None:
+            return None
+        return transcribe_pcm(samples, groq_api_key, max_chunk_seconds, max_workers)
+    
+    # Step 1: Extract audio into memory
+    extracted = extract_audio_for_upload(video_path)
+    
+    if not extracted:
         return None
+    
+    audio, filename = extracted
+    
+    # Step 2: Transcribe with Whisper
+    return transcribe_with_whisper_groq(audio, groq_api_key, filename)
+
+
+def benchmark_audio_formats(video_path: str, groq_api_key: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Compare the old temp-file MP3 path with in-memory FLAC and Opus
+    
+    Reports audio size and extraction time for each, plus end-to-end
+    transcription latency when a Groq API key is given.
+    
+    Args:
+        video_path: Path to video file
+        groq_api_key: Optional Groq API key for the transcription timing
+    
+    Returns:
+        Dictionary of {format: {"bytes", "extract_seconds", "transcribe_seconds"}}
+    """
+    results = {}
+    
+    # Old path: MP3 written to a temp file, then read back
+    start = time.time()
+    audio_path = extract_audio_from_video(video_path)
+    mp3_audio = None
+    if audio_path:
+        with open(audio_path, "rb") as file:
+            mp3_audio = file.read()
+        os.remove(audio_path)
+    results["mp3 (temp file)"] = {"audio": mp3_audio, "filename": "audio.mp3", "extract_seconds": time.time() - start}
+    
+    for audio_format in ("flac", "opus"):
+        start = time.time()
+        audio = extract_audio_bytes(video_path, audio_format)
+        results[f"{audio_format} (in memory)"] = {
+            "audio": audio,
+            "filename": AUDIO_FORMATS[audio_format][1],
+            "extract_seconds": time.time() - start
+        }
+    
+    for result in results.values():
+        result["bytes"] = len(result["audio"] or b"")
+        result["transcribe_seconds"] = None
+        if groq_api_key and result["audio"]:
+            start = time.time()
+            transcribe_with_whisper_groq(result["audio"], groq_api_key, result["filename"])
+            result["transcribe_seconds"] = time.time() - start
+        del result["audio"]
+    
+    print("\n" + "=" * 60)
+    print("AUDIO FORMAT COMPARISON")
+    print("=" * 60)
+    for name, result in results.items():
+        line = f"  {name:<17} {result['bytes'] / 1024:8.0f} KB   extract {result['extract_seconds']:5.2f}s"
+        if result["transcribe_seconds"] is not None:
+            line += f"   end-to-end {result['extract_seconds'] + result['transcribe_seconds']:5.2f}s"
+        print(line)
+    
+    return results
 
 
 if __name__ == "__main__":
@@ -171,6 +611,16 @@ if __name__ == "__main__":
     load_dotenv()
     
     groq_api_key = os.getenv("GROQ_API_KEY")
+    
+    if "--benchmark" in sys.argv:
+        # Size/speed comparison of audio formats (transcription timed if a key is set)
+        args = [arg for arg in sys.argv[1:] if arg != "--benchmark"]
+        if not args:
+            print("Usage: python whisper_transcription.py --benchmark <video_path>")
+            sys.exit(1)
+        benchmark_audio_formats(args[0], groq_api_key)
+        sys.exit(0)
+    
     if not groq_api_key:
         print("ERROR: GROQ_API_KEY not found in .env")
         print("Please add: GROQ_API_KEY=your_key_here")